@@ -0,0 +1,120 @@
+import hashlib
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mirror import MirrorHandler, MirrorServer
+from net import set_mirror
+
+# Synthetic stand-in for Mojang and Forge servers. Files are laid out the way net.mirror_url
+# addresses them (<host>/<path>), so the launcher code runs unchanged with the mirror pointed here.
+
+MANIFEST_PATH = 'launchermeta.mojang.com/mc/game/version_manifest_v2.json'
+FORGE_PATH = 'files.minecraftforge.net/maven/net/minecraftforge/forge'
+
+
+def write_file(root, relative_path, data):
+    path = os.path.join(root, *relative_path.split('/'))
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as file:
+        file.write(data)
+    return hashlib.sha1(data).hexdigest()
+
+
+def build_fake_upstream(root, seed=1, releases=120, snapshots=200, installable=3, libraries=40,
+                        library_size=200 * 1024, assets=2000, asset_size=4 * 1024, client_size=2 * 1024 * 1024,
+                        forge_versions=40, forge_size=5 * 1024 * 1024):
+    rng = random.Random(seed)
+
+    def blob(size):
+        return rng.getrandbits(8 * size).to_bytes(size, 'little')
+
+    objects = {}
+    for i in range(assets):
+        data = blob(rng.randint(asset_size // 2, asset_size * 2))
+        asset_hash = hashlib.sha1(data).hexdigest()
+        write_file(root, f'resources.download.minecraft.net/{asset_hash[:2]}/{asset_hash}', data)
+        objects[f'minecraft/sounds/bench/{i}.ogg'] = {'hash': asset_hash, 'size': len(data)}
+    asset_index = json.dumps({'objects': objects}).encode()
+    asset_index_sha1 = write_file(root, 'piston-meta.mojang.com/v1/packages/assets/bench.json', asset_index)
+
+    library_entries = []
+    for i in range(libraries):
+        data = blob(rng.randint(library_size // 2, library_size * 2))
+        path = f'org/bench/lib{i}/1.0/lib{i}-1.0.jar'
+        sha1 = write_file(root, f'libraries.minecraft.net/{path}', data)
+        library_entries.append({'name': f'org.bench:lib{i}:1.0', 'downloads': {'artifact': {
+            'path': path, 'url': f'https://libraries.minecraft.net/{path}', 'sha1': sha1, 'size': len(data)}}})
+
+    client = blob(client_size)
+    client_sha1 = write_file(root, 'piston-data.mojang.com/v1/objects/client.jar', client)
+
+    version_ids = [f'1.{minor}.{patch}' for minor in range(releases // 10 + 1) for patch in range(10)][:releases]
+    version_ids += [f'{20 + i // 52}w{i % 52 + 1:02d}a' for i in range(snapshots)]
+    version_ids += [f'{version_id}-forge' for version_id in version_ids[:forge_versions]]
+    manifest = {'latest': {'release': version_ids[0], 'snapshot': version_ids[releases]}, 'versions': []}
+    for position, version_id in enumerate(version_ids):
+        version = {
+            'id': version_id,
+            'type': 'snapshot' if 'w' in version_id else 'release',
+            'mainClass': 'net.minecraft.client.main.Main',
+            'libraries': library_entries,
+            'downloads': {'client': {'url': 'https://piston-data.mojang.com/v1/objects/client.jar', 'sha1': client_sha1, 'size': client_size}},
+            'assetIndex': {'id': 'bench', 'url': 'https://piston-meta.mojang.com/v1/packages/assets/bench.json', 'sha1': asset_index_sha1},
+        }
+        if position >= installable:
+            # Only a few versions carry the full file set; the rest just fill the manifest
+            version = {key: value for key, value in version.items() if key in ('id', 'type', 'mainClass')}
+        data = json.dumps(version).encode()
+        sha1 = write_file(root, f'piston-meta.mojang.com/v1/packages/{version_id}.json', data)
+        manifest['versions'].append({'id': version_id, 'type': version['type'], 'sha1': sha1,
+                                     'url': f'https://piston-meta.mojang.com/v1/packages/{version_id}.json',
+                                     'releaseTime': '2024-01-01T00:00:00+00:00'})
+    write_file(root, MANIFEST_PATH, json.dumps(manifest).encode())
+
+    # Forge installers exist for every other Forge candidate, so probing sees both answers
+    installer = blob(forge_size)
+    for version_id in version_ids[:forge_versions:2]:
+        path = f'{FORGE_PATH}/{version_id}-recommended/forge-{version_id}-recommended-installer.jar'
+        sha1 = write_file(root, path, installer)
+        write_file(root, path + '.sha1', sha1.encode())
+    return version_ids[:installable]
+
+
+class ThrottledHandler(MirrorHandler):
+    latency = 0.0
+    bandwidth = None
+
+    def handle_request(self, send_body):
+        if self.latency:
+            time.sleep(self.latency)
+        super().handle_request(send_body)
+
+    def copy_body(self, file):
+        if not self.bandwidth:
+            super().copy_body(file)
+            return
+        chunk_size = 16 * 1024
+        for chunk in iter(lambda: file.read(chunk_size), b''):
+            self.wfile.write(chunk)
+            time.sleep(len(chunk) / self.bandwidth)
+
+
+class FakeUpstream:
+    # latency in seconds per request, bandwidth in bytes per second per connection
+    def __init__(self, root, latency=0.0, bandwidth=None):
+        handler = type('BenchHandler', (ThrottledHandler,), {'latency': latency, 'bandwidth': bandwidth})
+        self.server = MirrorServer(root, host='127.0.0.1', port=0, upstream=None, handler=handler)
+
+    def __enter__(self):
+        self.server.start()
+        set_mirror(self.server.base_url)
+        return self
+
+    def __exit__(self, *exc_info):
+        set_mirror(None)
+        self.server.stop()
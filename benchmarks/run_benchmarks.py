@@ -0,0 +1,185 @@
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_upstream import FakeUpstream, build_fake_upstream
+from forge import ForgeResolver, download_forge_installer
+from installer import InstallEngine
+from manifest_cache import ManifestCache
+from object_store import ObjectStore
+from version_index import build_version_index, forge_candidates
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    position = (len(ordered) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def summarize(samples):
+    return {
+        'runs': len(samples),
+        'min': min(samples),
+        'p50': percentile(samples, 0.5),
+        'p90': percentile(samples, 0.9),
+        'p99': percentile(samples, 0.99),
+        'max': max(samples),
+        'mean': sum(samples) / len(samples),
+        'samples': samples,
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=os.path.dirname(os.path.abspath(__file__)),
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class BenchmarkRun:
+    def __init__(self, work_directory, repeat):
+        self.work_directory = work_directory
+        self.repeat = repeat
+        self.results = {}
+        self.counter = 0
+
+    def fresh_directory(self, name):
+        self.counter += 1
+        path = os.path.join(self.work_directory, f'{name}-{self.counter}')
+        os.makedirs(path)
+        return path
+
+    def measure(self, name, body, setup=None):
+        # setup() runs untimed before every sample and returns the argument for body()
+        samples = []
+        for _ in range(self.repeat):
+            argument = setup() if setup else None
+            start = time.perf_counter()
+            body(argument)
+            samples.append(round(time.perf_counter() - start, 6))
+        self.results[name] = summarize(samples)
+        print(f"{name:<24} p50={self.results[name]['p50'] * 1000:9.1f} ms  p90={self.results[name]['p90'] * 1000:9.1f} ms", file=sys.stderr)
+
+    def skip(self, name, reason):
+        self.results[name] = {'skipped': reason}
+        print(f"{name:<24} skipped: {reason}", file=sys.stderr)
+
+
+def run_benchmarks(run, installable):
+    warm_launcher = run.fresh_directory('launcher')
+    ManifestCache(warm_launcher).get_versions()
+    ForgeResolver(os.path.join(warm_launcher, 'forge_cache.json')).resolve(forge_candidates(ManifestCache(warm_launcher).cached_versions()))
+
+    # Version list: manifest download, Forge probing and building the index, as populate_version_list does it
+    def version_list(launcher_directory):
+        versions = ManifestCache(launcher_directory).get_versions()
+        forge_available = ForgeResolver(os.path.join(launcher_directory, 'forge_cache.json')).resolve(forge_candidates(versions))
+        return build_version_index(versions, forge_available)
+    run.measure('version_list_cold', version_list, lambda: run.fresh_directory('launcher'))
+    run.measure('version_list_warm', version_list, lambda: warm_launcher)
+
+    # Type-ahead: one filter call per keystroke on a fresh index, as the search box does it
+    def version_search(index):
+        for length in range(1, len('1.20.1') + 1):
+            index.filter('1.20.1'[:length], 'All')
+    run.measure('version_search', version_search, lambda: version_list(warm_launcher))
+
+    def forge_probe(launcher_directory):
+        versions = ManifestCache(launcher_directory).cached_versions()
+        ForgeResolver(os.path.join(launcher_directory, 'forge_cache.json')).resolve(forge_candidates(versions))
+
+    def cold_probe_setup():
+        launcher_directory = run.fresh_directory('launcher')
+        shutil.copy(os.path.join(warm_launcher, 'version_manifest_cache.json'), launcher_directory)
+        return launcher_directory
+    run.measure('forge_probe_cold', forge_probe, cold_probe_setup)
+    run.measure('forge_probe_warm', forge_probe, lambda: warm_launcher)
+
+    version_id = installable[0]
+
+    def install(directories):
+        instance_directory, store_directory = directories
+        engine = InstallEngine(instance_directory, manifest_cache=ManifestCache(warm_launcher), store=ObjectStore(store_directory))
+        engine.install(version_id)
+    run.measure('install_cold', install, lambda: (run.fresh_directory('instance'), run.fresh_directory('store')))
+    warm_instance = (run.fresh_directory('instance'), run.fresh_directory('store'))
+    install(warm_instance)
+    run.measure('install_warm', install, lambda: warm_instance)
+
+    forge_version = forge_candidates(ManifestCache(warm_launcher).cached_versions())[0]
+    run.measure('forge_download_cold', lambda directory: download_forge_installer(forge_version, directory),
+                lambda: run.fresh_directory('forge'))
+    cached_forge = run.fresh_directory('forge')
+    download_forge_installer(forge_version, cached_forge)
+    run.measure('forge_download_cached', lambda directory: download_forge_installer(forge_version, directory),
+                lambda: cached_forge)
+
+    try:
+        import minecraft_launcher_lib.command  # noqa: F401
+    except ImportError:
+        run.skip('launch_plan_cold', 'minecraft_launcher_lib is not installed')
+        run.skip('launch_plan_warm', 'minecraft_launcher_lib is not installed')
+        return
+    from launch_plan import get_launch_plan
+
+    def cold_plan_setup():
+        plans_directory = os.path.join(warm_instance[0], 'launch_plans')
+        shutil.rmtree(plans_directory, ignore_errors=True)
+        return warm_instance[0]
+    run.measure('launch_plan_cold', lambda directory: get_launch_plan(version_id, directory), cold_plan_setup)
+    run.measure('launch_plan_warm', lambda directory: get_launch_plan(version_id, directory), lambda: warm_instance[0])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='HexoLauncher benchmarks against a local fake upstream')
+    parser.add_argument('--repeat', type=int, default=5, help='Samples per benchmark')
+    parser.add_argument('--latency-ms', type=float, default=20.0, help='Simulated latency per request')
+    parser.add_argument('--bandwidth-mbps', type=float, default=0.0, help='Simulated bandwidth per connection, 0 = unlimited')
+    parser.add_argument('--assets', type=int, default=2000, help='Number of asset objects')
+    parser.add_argument('--libraries', type=int, default=40, help='Number of libraries')
+    parser.add_argument('--seed', type=int, default=1, help='Seed for the synthetic data')
+    parser.add_argument('--output', type=str, help='Write results as JSON to this file instead of stdout')
+    parser.add_argument('--keep', action='store_true', help='Keep the work directory')
+    args = parser.parse_args()
+
+    work_directory = tempfile.mkdtemp(prefix='hexolauncher-bench-')
+    upstream_directory = os.path.join(work_directory, 'upstream')
+    installable = build_fake_upstream(upstream_directory, seed=args.seed, assets=args.assets, libraries=args.libraries)
+    bandwidth = args.bandwidth_mbps * 1024 * 1024 / 8 if args.bandwidth_mbps else None
+
+    run = BenchmarkRun(work_directory, args.repeat)
+    try:
+        with FakeUpstream(upstream_directory, latency=args.latency_ms / 1000, bandwidth=bandwidth):
+            run_benchmarks(run, installable)
+    finally:
+        if not args.keep:
+            shutil.rmtree(work_directory, ignore_errors=True)
+
+    report = {
+        'commit': git_commit(),
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'config': {key: value for key, value in vars(args).items() if key not in ('output', 'keep')},
+        'results': run.results,
+    }
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(report, file, indent=4)
+    else:
+        print(json.dumps(report, indent=4))
+
+
+if __name__ == '__main__':
+    main()
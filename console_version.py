@@ -1,48 +1,236 @@
+import os
 import sys
+import json
+import logging
 import argparse
-import subprocess
 
-from minecraft_launcher_lib.utils import get_minecraft_directory, get_version_list
-from minecraft_launcher_lib.install import install_minecraft_version
-from minecraft_launcher_lib.command import get_minecraft_command
+from minecraft_launcher_lib.utils import get_minecraft_directory
 from random_username.generate import generate_username
 from uuid import uuid1
 
+from installer import INSTALL_ENGINES, install_version
+from jvm_profile import build_launch_options, get_profile, save_profile
+from launch_plan import get_launch_plan
+from manifest_cache import get_manifest_cache
+from mirror import DEFAULT_PORT, MirrorServer
+from net import set_mirror
+from object_store import ObjectStore
+from provision import load_specs, provision, write_report
+from snapshot import SnapshotError, SnapshotStore
+from supervisor import Supervisor, collect_status, format_status
+from tracing import configure_tracing, tracer
+
 class LaunchThread:
-    def __init__(self, version_id, username):
+    def __init__(self, version_id, username, install_engine='parallel', minecraft_directory=None, supervisor=None, detach=False):
         self.version_id = version_id
         self.username = username
+        self.install_engine = install_engine
+        self.minecraft_directory = minecraft_directory or get_minecraft_directory().replace('minecraft', 'hexolauncher')
+        self.supervisor = supervisor or Supervisor(get_minecraft_directory().replace('minecraft', 'hexolauncher'), echo=True)
+        self.detach = detach
 
-    def launch_game(self):
-        minecraft_directory = get_minecraft_directory().replace('minecraft', 'hexolauncher')
-
-        install_minecraft_version(versionid=self.version_id, minecraft_directory=minecraft_directory)
+    def install(self):
+        launcher_directory = get_minecraft_directory().replace('minecraft', 'hexolauncher')
+        store = ObjectStore(os.path.join(launcher_directory, 'store'))
+        # Версия JSON берётся из кэша манифеста, чтобы не скачивать манифест повторно
+        with tracer.span('vanilla_install', version=self.version_id):
+            install_version(self.version_id, self.minecraft_directory, engine=self.install_engine, manifest_cache=get_manifest_cache(launcher_directory), store=store)
 
+    def launch(self):
         if self.username == '':
             self.username = generate_username()[0]
 
-        options = {
-            'username': self.username,
-            'uuid': str(uuid1()),
-            'token': ''
-        }
-
-        minecraft_command = get_minecraft_command(version=self.version_id, minecraft_directory=minecraft_directory, options=options)
+        with tracer.span('command_generation', version=self.version_id):
+            config = load_launcher_config()
+            options = build_launch_options(config, self.version_id, self.minecraft_directory)
+            save_launcher_config(config)
+            plan = get_launch_plan(self.version_id, self.minecraft_directory, options)
 
         try:
-            subprocess.Popen(minecraft_command, shell=True)  # Запускаем Minecraft через subprocess
+            with tracer.span('spawn', version=self.version_id):
+                # Запускаем Minecraft без shell; вывод игры собирает supervisor
+                self.supervisor.launch(plan, self.username, str(uuid1()), '', cwd=self.minecraft_directory, version_id=self.version_id, detach=self.detach)
         except Exception as e:
             print("Error launching Minecraft:", e)
 
+    def launch_game(self):
+        with tracer.span('launch_pipeline', version=self.version_id):
+            self.install()
+            self.launch()
+
+def list_versions(release_type):
+    minecraft_directory = get_minecraft_directory().replace('minecraft', 'hexolauncher')
+    for version in get_manifest_cache(minecraft_directory).get_versions():
+        if release_type is None or version['type'] == release_type:
+            print(version['id'])
+
+def collect_garbage():
+    minecraft_directory = get_minecraft_directory().replace('minecraft', 'hexolauncher')
+    removed, freed = ObjectStore(os.path.join(minecraft_directory, 'store')).collect_garbage()
+    print(f"Removed {removed} unused objects, freed {freed / 1024 / 1024:.1f} MB")
+    removed, freed = SnapshotStore(os.path.join(minecraft_directory, 'snapshots')).collect_garbage()
+    print(f"Removed {removed} unused backup chunks, freed {freed / 1024 / 1024:.1f} MB")
+
+def show_status():
+    minecraft_directory = get_minecraft_directory().replace('minecraft', 'hexolauncher')
+    records = collect_status(minecraft_directory)
+    if not records:
+        print("No instances launched in the last 24 hours")
+        return
+    print('\n'.join(format_status(records)))
+
+def manage_snapshots(args):
+    minecraft_directory = get_minecraft_directory().replace('minecraft', 'hexolauncher')
+    store = SnapshotStore(os.path.join(minecraft_directory, 'snapshots'), launcher_directory=minecraft_directory)
+    instance_directory = args.instance or minecraft_directory
+    try:
+        if args.backup:
+            snapshot = store.create(instance_directory)
+            print(f"Backup {snapshot['id']} created: {snapshot['changed'] / 1024 / 1024:.1f} MB changed, {snapshot['stored'] / 1024 / 1024:.1f} MB stored")
+        elif args.restore:
+            restored, unchanged, removed = store.restore(args.restore, args.instance, args.only)
+            print(f"Restored {restored} files ({unchanged} unchanged, {removed} removed)")
+        elif args.delete_backup:
+            store.delete(args.delete_backup)
+        else:
+            for snapshot in store.list_snapshots(args.instance):
+                print(f"{snapshot['id']}  {snapshot['size'] / 1024 / 1024:10.1f} MB  {snapshot['source']}")
+    except (SnapshotError, OSError) as e:
+        print("Backup operation failed:", e)
+        return 1
+    return 0
+
+def provision_batch(args):
+    launcher_directory = get_minecraft_directory().replace('minecraft', 'hexolauncher')
+    specs = load_specs(args.batch, args.batch_file, launcher_directory)
+    if not specs:
+        print("No versions to provision")
+        return 1
+
+    report = provision(specs, launcher_directory, concurrency=args.concurrency, parallel_versions=args.parallel, engine=args.engine)
+    if args.report:
+        write_report(report, args.report)
+    else:
+        print(json.dumps(report, indent=4))
+    print(f"Provisioned {len(specs) - report['failed']}/{len(specs)} versions in {report['seconds']}s, {report['bytes'] / 1024 / 1024:.1f} MB downloaded")
+
+    if not args.install_only:
+        supervisor = Supervisor(launcher_directory, echo=True)
+        for result in report['versions']:
+            if result['status'] == 'ok':
+                LaunchThread(result['version'], args.username, args.engine, minecraft_directory=result['instance'], supervisor=supervisor, detach=args.detach).launch()
+        supervisor.wait()
+    return 1 if report['failed'] else 0
+
+def load_launcher_config():
+    config_file = os.path.join(get_minecraft_directory().replace('minecraft', 'hexolauncher'), 'launcher_config.json')
+    try:
+        with open(config_file, 'r') as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return {}
+
+def save_launcher_config(config):
+    config_file = os.path.join(get_minecraft_directory().replace('minecraft', 'hexolauncher'), 'launcher_config.json')
+    os.makedirs(os.path.dirname(config_file), exist_ok=True)
+    tmp_file = f'{config_file}.{os.getpid()}.tmp'
+    with open(tmp_file, 'w') as file:
+        json.dump(config, file, indent=4)
+    os.replace(tmp_file, config_file)
+
+def update_jvm_profile(args):
+    # Pinned memory turns off automatic sizing for this instance until --max-memory 0
+    minecraft_directory = args.instance or get_minecraft_directory().replace('minecraft', 'hexolauncher')
+    config = load_launcher_config()
+    profile = get_profile(config, minecraft_directory)
+    if args.max_memory is not None:
+        profile['auto'] = args.max_memory == 0
+        profile['max_memory_mb'] = args.max_memory or None
+        profile['min_memory_mb'] = args.max_memory // 2 or None
+    if args.no_cds:
+        profile['cds'] = False
+    save_profile(config, minecraft_directory, profile)
+    save_launcher_config(config)
+
+def serve_mirror(port):
+    minecraft_directory = get_minecraft_directory().replace('minecraft', 'hexolauncher')
+    server = MirrorServer(os.path.join(minecraft_directory, 'mirror'), port=port)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
+
 def cli():
     parser = argparse.ArgumentParser(description='HexoLauncher CLI')
-    parser.add_argument('version', type=str, help='Minecraft version')
+    parser.add_argument('version', type=str, nargs='?', help='Minecraft version, or "status" to show running instances')
+    parser.add_argument('--detach', action='store_true', help='Return right after starting the game instead of streaming its output until it exits')
     parser.add_argument('--username', type=str, default='', help='Minecraft username')
+    parser.add_argument('--engine', type=str, default='parallel', choices=INSTALL_ENGINES, help='Install engine to use')
+    parser.add_argument('--batch', type=str, nargs='+', metavar='SPEC', help='Install several versions at once, SPEC is version or version@instance_folder')
+    parser.add_argument('--batch-file', type=str, help='File with one SPEC per line')
+    parser.add_argument('--install-only', action='store_true', help='Install without launching the game')
+    parser.add_argument('--report', type=str, help='Write the batch report as JSON to this file')
+    parser.add_argument('--concurrency', type=int, default=16, help='Global limit of concurrent downloads in batch mode')
+    parser.add_argument('--parallel', type=int, default=4, help='Number of versions installed at the same time in batch mode')
+    parser.add_argument('--mirror', type=str, help='Base URL of a LAN mirror to download everything through')
+    parser.add_argument('--serve-mirror', action='store_true', help='Run a caching mirror server for other launchers')
+    parser.add_argument('--mirror-port', type=int, default=DEFAULT_PORT, help='Port for --serve-mirror')
+    parser.add_argument('--gc', action='store_true', help='Remove unused files from the shared object store and exit')
+    parser.add_argument('--list', action='store_true', help='List available versions and exit')
+    parser.add_argument('--type', type=str, default=None, help='Only list versions of this type (release, snapshot, ...)')
+    parser.add_argument('--backup', action='store_true', help='Create an incremental backup of the instance folder and exit')
+    parser.add_argument('--backups', action='store_true', help='List backups and exit')
+    parser.add_argument('--restore', type=str, metavar='BACKUP_ID', help='Restore a backup into its instance folder and exit')
+    parser.add_argument('--only', type=str, nargs='+', metavar='PATH', help='Restore only these paths, e.g. "saves/New World" config')
+    parser.add_argument('--delete-backup', type=str, metavar='BACKUP_ID', help='Delete a backup; --gc frees its chunks')
+    parser.add_argument('--instance', type=str, help='Instance folder to launch, back up or configure, defaults to the launcher folder')
+    parser.add_argument('--max-memory', type=int, metavar='MB', help='Pin the heap size of the instance, 0 goes back to automatic sizing')
+    parser.add_argument('--no-cds', action='store_true', help='Do not create or use a class data sharing archive for the instance')
+    parser.add_argument('--log-level', type=str, default=None, choices=['DEBUG', 'INFO', 'WARNING', 'ERROR'], help='Logging level, defaults to log_level from the launcher config or INFO')
+    parser.add_argument('--no-trace', action='store_true', help='Do not write traces.jsonl and metrics.prom')
 
     args = parser.parse_args()
+    config = load_launcher_config()
+    logging.basicConfig(level=args.log_level or config.get('log_level', 'INFO').upper(), format='%(asctime)s - %(levelname)s - %(message)s')
+    configure_tracing(get_minecraft_directory().replace('minecraft', 'hexolauncher'), not args.no_trace and config.get('tracing', True))
+
+    if args.serve_mirror:
+        serve_mirror(args.mirror_port)
+        return
+    if args.version == 'status':
+        show_status()
+        return
+    mirror_url = args.mirror or config.get('mirror_url')
+    if mirror_url:
+        set_mirror(mirror_url)
+
+    if args.max_memory is not None or args.no_cds:
+        update_jvm_profile(args)
+    if args.backup or args.backups or args.restore or args.delete_backup:
+        sys.exit(manage_snapshots(args))
+    if args.gc:
+        collect_garbage()
+        return
+    if args.list:
+        list_versions(args.type)
+        return
+    if args.batch or args.batch_file:
+        status = provision_batch(args)
+        tracer.flush()
+        sys.exit(status)
+    if args.version is None:
+        parser.error('the following arguments are required: version')
 
-    launcher = LaunchThread(args.version, args.username)
-    launcher.launch_game()
+    launcher = LaunchThread(args.version, args.username, args.engine, args.instance, detach=args.detach)
+    try:
+        if args.install_only:
+            launcher.install()
+        else:
+            launcher.launch_game()
+    finally:
+        tracer.flush()
+    if not args.install_only and not args.detach:
+        sys.exit(launcher.supervisor.wait())
 
 class MainWindow:
     def __init__(self):
@@ -0,0 +1,419 @@
+import json
+import logging
+import os
+import shutil
+import subprocess
+import threading
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from install_index import InstallIndex
+from net import file_sha1, make_session, mirror_url
+from object_store import link_or_copy
+from tracing import tracer
+
+FORGE_MAVEN_URL = 'https://files.minecraftforge.net/maven/net/minecraftforge/forge'
+
+
+def forge_installer_url(base_version):
+    return f'{FORGE_MAVEN_URL}/{base_version}-recommended/forge-{base_version}-recommended-installer.jar'
+
+
+class ForgeResolver:
+    def __init__(self, cache_file, ttl=24 * 3600, negative_ttl=3600, max_workers=16, timeout=10, session=None):
+        self.cache_file = cache_file
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.session = session or make_session(max_workers)
+        self.lock = threading.Lock()
+        self.cache = self.load_cache()
+        self.last_misses = 0
+
+    def load_cache(self):
+        try:
+            with open(self.cache_file, 'r') as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return {}
+
+    def save_cache(self):
+        os.makedirs(os.path.dirname(self.cache_file), exist_ok=True)
+        tmp_file = self.cache_file + '.tmp'
+        with self.lock:
+            data = dict(self.cache)
+        try:
+            with open(tmp_file, 'w') as file:
+                json.dump(data, file, indent=4)
+            os.replace(tmp_file, self.cache_file)
+        except OSError as e:
+            logging.warning(f"Could not save Forge cache: {e}")
+
+    def cached(self, base_version):
+        # Returns True/False from a fresh cache entry, None if the version has to be probed
+        entry = self.cache.get(base_version)
+        if entry is None:
+            return None
+        ttl = self.ttl if entry['exists'] else self.negative_ttl
+        if time.time() - entry['checked'] > ttl:
+            return None
+        return entry['exists']
+
+    def probe(self, base_version):
+        with tracer.span('forge_probe', kind='http', version=base_version) as span:
+            try:
+                response = self.session.head(mirror_url(forge_installer_url(base_version)), timeout=self.timeout)
+            except requests.RequestException as e:
+                # Network errors are not cached, the next start will probe again
+                logging.debug("Forge probe for %s failed: %s", base_version, e)
+                return None
+            span.set(status=response.status_code)
+            return response.status_code == 200
+
+    def resolve(self, base_versions, probe=True):
+        # With probe=False only cached results are used and unknown versions count as missing
+        with tracer.span('forge_resolve') as span:
+            results = self.resolve_versions(base_versions, probe)
+            span.set(versions=len(results), cache_misses=self.last_misses)
+        return results
+
+    def resolve_versions(self, base_versions, probe):
+        results = {}
+        pending = []
+        for base_version in set(base_versions):
+            exists = self.cached(base_version)
+            if exists is None and probe:
+                pending.append(base_version)
+            elif exists is None:
+                results[base_version] = False
+            else:
+                results[base_version] = exists
+
+        self.last_misses = len(pending)
+        if pending:
+            logging.debug(f"Probing Forge availability for {len(pending)} versions")
+            with ThreadPoolExecutor(max_workers=min(self.max_workers, len(pending))) as pool:
+                probed = list(pool.map(self.probe, pending))
+            now = time.time()
+            with self.lock:
+                for base_version, exists in zip(pending, probed):
+                    if exists is not None:
+                        self.cache[base_version] = {'exists': exists, 'checked': now}
+                    results[base_version] = bool(exists)
+            self.save_cache()
+
+        return results
+
+    def exists(self, base_version):
+        return self.resolve([base_version])[base_version]
+
+
+class ForgeDownloadError(Exception):
+    pass
+
+
+def fetch_published_sha1(session, url, timeout):
+    # Forge's maven publishes a .sha1 next to every artifact; older installers may not have one
+    try:
+        response = session.get(mirror_url(url + '.sha1'), timeout=timeout)
+    except requests.RequestException as e:
+        logging.debug(f"Could not fetch checksum for {url}: {e}")
+        return None
+    if response.status_code != 200:
+        return None
+    checksum = response.text.strip().split()[0].lower() if response.text.strip() else ''
+    return checksum if len(checksum) == 40 else None
+
+
+def download_forge_installer(base_version, cache_directory, progress=None, session=None, timeout=30, retries=4, backoff=0.5,
+                             bytes_callback=None):
+    # Installers are cached per version; a verified cached installer costs no network traffic
+    with tracer.span('forge_installer', version=base_version) as span:
+        try:
+            installer_path = fetch_forge_installer(base_version, cache_directory, progress, session, timeout, retries, backoff,
+                                                   bytes_callback, span)
+        except OSError as e:
+            # Disk errors of the cache (full disk, permissions) fail the download like network errors do
+            raise ForgeDownloadError(f'Could not store the Forge installer for {base_version}: {e}')
+    return installer_path
+
+
+def fetch_forge_installer(base_version, cache_directory, progress, session, timeout, retries, backoff, bytes_callback, span):
+    installer_path = os.path.join(cache_directory, base_version, f'forge-{base_version}-installer.jar')
+    # Only holds a checksum published by Forge's maven, never one computed here
+    checksum_file = installer_path + '.sha1'
+    session = session or make_session(1)
+    url = forge_installer_url(base_version)
+    expected_sha1 = None
+    if os.path.isfile(installer_path):
+        if os.path.isfile(checksum_file):
+            with open(checksum_file, 'r') as file:
+                expected_sha1 = file.read().strip()
+        else:
+            expected_sha1 = fetch_published_sha1(session, url, timeout)
+        if expected_sha1 is not None and file_sha1(installer_path) == expected_sha1:
+            logging.debug(f"Using cached Forge installer for {base_version}")
+            span.set(cache='hit')
+            write_checksum(checksum_file, expected_sha1)
+            return installer_path
+        if expected_sha1 is None and is_intact_jar(installer_path):
+            # Nothing to verify against, so this stays unverified and is checked again next time
+            logging.debug(f"Using unverified cached Forge installer for {base_version}")
+            span.set(cache='unverified')
+            return installer_path
+        logging.warning(f"Cached Forge installer for {base_version} is corrupted, downloading again")
+
+    span.set(cache='miss')
+    if expected_sha1 is None or not os.path.isfile(checksum_file):
+        expected_sha1 = fetch_published_sha1(session, url, timeout)
+    os.makedirs(os.path.dirname(installer_path), exist_ok=True)
+    part_path = installer_path + '.part'
+
+    for attempt in range(retries):
+        try:
+            with tracer.span('forge_installer', kind='http', url=url, attempt=attempt) as request_span:
+                request_span.set(bytes=stream_with_resume(session, url, part_path, progress, timeout, bytes_callback))
+            break
+        except (requests.RequestException, OSError) as e:
+            status = e.response.status_code if isinstance(e, requests.HTTPError) and e.response is not None else None
+            if status is not None and 400 <= status < 500 and status not in (408, 429):
+                # The build does not exist, retrying won't change that
+                raise ForgeDownloadError(f'Could not download {url}: {e}')
+            if attempt == retries - 1:
+                raise ForgeDownloadError(f'Could not download {url}: {e}')
+            delay = backoff * 2 ** attempt
+            logging.debug(f"Resuming Forge download in {delay:.1f}s: {e}")
+            time.sleep(delay)
+
+    sha1 = file_sha1(part_path)
+    if expected_sha1 is not None and sha1 != expected_sha1:
+        os.remove(part_path)
+        raise ForgeDownloadError(f'Checksum mismatch for {url}')
+    os.replace(part_path, installer_path)
+    if expected_sha1 is not None:
+        write_checksum(checksum_file, expected_sha1)
+    elif os.path.isfile(checksum_file):
+        os.remove(checksum_file)
+    return installer_path
+
+
+def write_checksum(checksum_file, sha1):
+    if os.path.isfile(checksum_file):
+        return
+    with open(checksum_file, 'w') as file:
+        file.write(sha1)
+
+
+def is_intact_jar(path):
+    try:
+        with zipfile.ZipFile(path) as jar:
+            return jar.testzip() is None
+    except (OSError, zipfile.BadZipFile):
+        return False
+
+
+def stream_with_resume(session, url, part_path, progress, timeout, bytes_callback=None):
+    offset = os.path.getsize(part_path) if os.path.isfile(part_path) else 0
+    headers = {'Range': f'bytes={offset}-'} if offset else {}
+    with session.get(mirror_url(url), headers=headers, stream=True, timeout=timeout) as response:
+        if response.status_code == 416:
+            # The partial file is already complete
+            return 0
+        response.raise_for_status()
+        if offset and response.status_code != 206:
+            # Server ignored the Range header, start over
+            offset = 0
+        content_length = response.headers.get('content-length')
+        total = offset + int(content_length) if content_length is not None else None
+
+        done = offset
+        last_percent = -1
+        with open(part_path, 'ab' if offset else 'wb') as file:
+            for chunk in response.iter_content(chunk_size=64 * 1024):
+                file.write(chunk)
+                done += len(chunk)
+                if bytes_callback is not None:
+                    bytes_callback(len(chunk))
+                if progress is not None and total:
+                    percent = done * 100 // total
+                    if percent != last_percent:
+                        last_percent = percent
+                        progress(percent)
+    return done - offset
+
+
+class ForgeInstallError(Exception):
+    pass
+
+
+def read_installer_profile(installer_path):
+    # Returns (install_profile, version JSON) of an installer without running it
+    try:
+        with zipfile.ZipFile(installer_path) as jar:
+            profile = json.loads(jar.read('install_profile.json'))
+            if 'versionInfo' in profile:
+                # 1.12 and older keep the version JSON inside the install profile
+                return profile, profile['versionInfo']
+            return profile, json.loads(jar.read(profile.get('json', '/version.json').lstrip('/')))
+    except (OSError, KeyError, ValueError, zipfile.BadZipFile) as e:
+        raise ForgeInstallError(f'Unreadable Forge installer {installer_path}: {e}')
+
+
+def maven_file(coordinate):
+    # group:artifact:version[:classifier][@extension], as used by installer data entries
+    name, _, extension = coordinate.partition('@')
+    parts = name.split(':')
+    file_name = f'{parts[1]}-{parts[2]}' + (f'-{parts[3]}' if len(parts) > 3 else '') + '.' + (extension or 'jar')
+    return '/'.join(parts[0].split('.') + [parts[1], parts[2], file_name])
+
+
+def required_files(profile, version):
+    # Library paths the installed profile needs, mapped to their SHA1 where the profile has one:
+    # the libraries of the version JSON, the processor tools, and the client files the processors produce
+    files = {}
+    if 'versionInfo' in profile:
+        # Old installers only extract the Forge jar itself, the launcher downloads the other libraries
+        return {maven_file(profile['install']['path']): None}
+    for library in version.get('libraries', []) + profile.get('libraries', []):
+        if library.get('clientreq') is False and library.get('serverreq'):
+            continue
+        artifact = library.get('downloads', {}).get('artifact') or {}
+        if artifact.get('path'):
+            files[artifact['path']] = artifact.get('sha1') or None
+        elif 'downloads' not in library:
+            files[maven_file(library['name'])] = (library.get('checksums') or [None])[0]
+    for value in profile.get('data', {}).values():
+        client = value.get('client', '') if isinstance(value, dict) else ''
+        if client.startswith('[') and client.endswith(']'):
+            files.setdefault(maven_file(client[1:-1]), None)
+    return files
+
+
+def verify_files(minecraft_directory, files, index):
+    # Files with a SHA1 are hashed unless the install index already vouches for them; the ones the
+    # processors produce have none, so for those only existence and a non-zero size are checked
+    for path, sha1 in files.items():
+        file_path = os.path.join(minecraft_directory, 'libraries', *path.split('/'))
+        try:
+            if sha1 is None:
+                if os.path.getsize(file_path) == 0:
+                    return False
+            elif not index.is_current(file_path, sha1):
+                if file_sha1(file_path) != sha1:
+                    return False
+                index.record(file_path, sha1)
+        except OSError:
+            return False
+    return True
+
+
+def version_file_path(minecraft_directory, version_id):
+    return os.path.join(minecraft_directory, 'versions', version_id, f'{version_id}.json')
+
+
+def is_profile_installed(minecraft_directory, version_id, files, index=None):
+    # The version JSON is recorded in the install index only after a verified install, so an
+    # interrupted installer run never counts as installed
+    index = index or InstallIndex(minecraft_directory)
+    if not index.is_current(version_file_path(minecraft_directory, version_id)):
+        return False
+    return verify_files(minecraft_directory, files, index)
+
+
+def mark_profile_installed(minecraft_directory, version_id, files, index):
+    version_file = version_file_path(minecraft_directory, version_id)
+    if not os.path.isfile(version_file) or not verify_files(minecraft_directory, files, index):
+        return False
+    index.record(version_file, file_sha1(version_file))
+    index.save()
+    return True
+
+
+def copy_installed_profile(source_directory, minecraft_directory, version_id, files):
+    # Libraries are hardlinked where possible, so every further instance costs almost no disk space
+    for path in files:
+        target = os.path.join(minecraft_directory, 'libraries', *path.split('/'))
+        if os.path.isfile(target):
+            continue
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        temp_target = f'{target}.{threading.get_ident()}.link'
+        link_or_copy(os.path.join(source_directory, 'libraries', *path.split('/')), temp_target)
+        os.replace(temp_target, target)
+    source_version = os.path.join(source_directory, 'versions', version_id)
+    target_version = os.path.join(minecraft_directory, 'versions', version_id)
+    os.makedirs(target_version, exist_ok=True)
+    for name in os.listdir(source_version):
+        if os.path.isfile(os.path.join(source_version, name)):
+            shutil.copy2(os.path.join(source_version, name), os.path.join(target_version, name))
+
+
+def prefill_libraries(store, minecraft_directory, files):
+    # The installer skips libraries that are already in place with the right checksum
+    linked = 0
+    for path, sha1 in files.items():
+        target = os.path.join(minecraft_directory, 'libraries', *path.split('/'))
+        if sha1 and not os.path.isfile(target) and store.has(sha1):
+            store.link_into(sha1, target)
+            linked += 1
+    return linked
+
+
+def run_forge_installer(installer_path, minecraft_directory, java='java'):
+    # The client installer refuses to run without a launcher profile file
+    launcher_profiles = os.path.join(minecraft_directory, 'launcher_profiles.json')
+    if not os.path.isfile(launcher_profiles):
+        os.makedirs(minecraft_directory, exist_ok=True)
+        with open(launcher_profiles, 'w') as file:
+            json.dump({'profiles': {}}, file)
+    with tracer.span('forge_installer_run', installer=os.path.basename(installer_path)):
+        subprocess.run([java, '-jar', installer_path, '--installClient', '--minecraftDir', minecraft_directory], check=True)
+
+
+def ensure_forge_installed(installer_path, minecraft_directory, store=None, java='java'):
+    # Returns the version id of the Forge profile. The installer only runs when neither this instance
+    # nor any other instance registered in the store has the complete profile yet.
+    profile, version = read_installer_profile(installer_path)
+    version_id = version['id']
+    files = required_files(profile, version)
+    index = InstallIndex(minecraft_directory)
+    if is_profile_installed(minecraft_directory, version_id, files, index):
+        logging.info(f"Forge {version_id} is already installed, skipping the installer")
+        return version_id
+
+    try:
+        if store is not None:
+            for source_directory in store.load_instances():
+                if os.path.abspath(source_directory) == os.path.abspath(minecraft_directory):
+                    continue
+                if not is_profile_installed(source_directory, version_id, files):
+                    continue
+                logging.info(f"Reusing Forge {version_id} from {source_directory}")
+                with tracer.span('forge_profile_copy', version=version_id):
+                    copy_installed_profile(source_directory, minecraft_directory, version_id, files)
+                if mark_profile_installed(minecraft_directory, version_id, files, index):
+                    store.register_instance(minecraft_directory)
+                    return version_id
+                logging.warning(f"Forge {version_id} copied from {source_directory} is incomplete, running the installer")
+            linked = prefill_libraries(store, minecraft_directory, files)
+            logging.debug("Linked %d Forge libraries from the object store", linked)
+
+        try:
+            run_forge_installer(installer_path, minecraft_directory, java)
+        except subprocess.CalledProcessError as e:
+            raise ForgeInstallError(f'Forge installer failed: {e}')
+        if not mark_profile_installed(minecraft_directory, version_id, files, index):
+            raise ForgeInstallError(f'Forge installer did not produce a complete {version_id} profile')
+
+        if store is not None:
+            # Every file with a SHA1 has just been verified against it, so the store only gets good copies
+            for path, sha1 in files.items():
+                if sha1:
+                    store.adopt(os.path.join(minecraft_directory, 'libraries', *path.split('/')), sha1)
+            store.register_instance(minecraft_directory)
+    except OSError as e:
+        raise ForgeInstallError(f'Could not install Forge {version_id}: {e}')
+    return version_id
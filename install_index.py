@@ -0,0 +1,75 @@
+import json
+import logging
+import os
+import threading
+
+
+class InstallIndex:
+    # Remembers size, mtime and SHA1 of every installed file, so a warm launch
+    # can trust stat() instead of hashing the whole instance again
+    def __init__(self, minecraft_directory):
+        self.minecraft_directory = minecraft_directory
+        self.index_file = os.path.join(minecraft_directory, 'install_index.json')
+        self.lock = threading.Lock()
+        self.dirty = False
+        data = self.load()
+        self.files = data.get('files', {})
+        self.runtimes = set(data.get('runtimes', []))
+
+    def load(self):
+        try:
+            with open(self.index_file, 'r') as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return {}
+
+    def save(self):
+        # Several engines of a batch install can share one index, so the whole write holds the lock
+        with self.lock:
+            if not self.dirty:
+                return
+            data = {'files': dict(self.files), 'runtimes': sorted(self.runtimes)}
+            os.makedirs(self.minecraft_directory, exist_ok=True)
+            tmp_file = f'{self.index_file}.{os.getpid()}.{threading.get_ident()}.tmp'
+            try:
+                with open(tmp_file, 'w') as file:
+                    json.dump(data, file)
+                os.replace(tmp_file, self.index_file)
+                self.dirty = False
+            except OSError as e:
+                logging.warning(f"Could not save install index: {e}")
+
+    def key(self, path):
+        return os.path.relpath(path, self.minecraft_directory).replace(os.sep, '/')
+
+    def is_current(self, path, sha1=None):
+        entry = self.files.get(self.key(path))
+        if entry is None:
+            return False
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return False
+        size, mtime, recorded_sha1 = entry
+        if stat.st_size != size or stat.st_mtime_ns != mtime:
+            return False
+        return sha1 is None or sha1 == recorded_sha1
+
+    def record(self, path, sha1):
+        stat = os.stat(path)
+        with self.lock:
+            self.files[self.key(path)] = [stat.st_size, stat.st_mtime_ns, sha1]
+            self.dirty = True
+
+    def forget(self, path):
+        with self.lock:
+            if self.files.pop(self.key(path), None) is not None:
+                self.dirty = True
+
+    def has_runtime(self, component):
+        return component in self.runtimes
+
+    def record_runtime(self, component):
+        with self.lock:
+            self.runtimes.add(component)
+            self.dirty = True
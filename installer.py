@@ -0,0 +1,470 @@
+import hashlib
+import json
+import logging
+import os
+import platform
+import shutil
+import threading
+import time
+import zipfile
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import requests
+
+from install_index import InstallIndex
+from net import file_sha1, make_session, mirror_url
+from tracing import tracer
+
+LIBRARIES_URL = 'https://libraries.minecraft.net/'
+RESOURCES_URL = 'https://resources.download.minecraft.net/'
+
+INSTALL_ENGINES = ('parallel', 'library')
+
+# install_jvm_runtime is not safe to run twice at once for the same directory
+runtime_lock = threading.Lock()
+
+
+class InstallError(Exception):
+    pass
+
+
+class ChecksumError(InstallError):
+    pass
+
+
+class Download:
+    def __init__(self, url, path, sha1=None, size=None, kind='library'):
+        self.url = url
+        self.path = path
+        self.sha1 = sha1
+        self.size = size
+        self.kind = kind
+
+
+def get_os_name():
+    system = platform.system()
+    if system == 'Windows':
+        return 'windows'
+    if system == 'Darwin':
+        return 'osx'
+    return 'linux'
+
+
+def get_arch_bits():
+    return '64' if platform.architecture()[0] == '64bit' else '32'
+
+
+def rule_matches(rule):
+    os_rule = rule.get('os', {})
+    if 'name' in os_rule and os_rule['name'] != get_os_name():
+        return False
+    if os_rule.get('arch') == 'x86' and get_arch_bits() != '32':
+        return False
+    # Feature rules (demo mode, custom resolution, ...) are never enabled by the launcher
+    if rule.get('features'):
+        return False
+    return True
+
+
+def rules_allow(rules):
+    if not rules:
+        return True
+    allowed = False
+    for rule in rules:
+        if rule_matches(rule):
+            allowed = rule['action'] == 'allow'
+    return allowed
+
+
+def maven_path(name, classifier=None):
+    parts = name.split(':')
+    group, artifact, version = parts[0], parts[1], parts[2]
+    if classifier is None and len(parts) > 3:
+        classifier = parts[3]
+    file_name = f'{artifact}-{version}' + (f'-{classifier}' if classifier else '') + '.jar'
+    return '/'.join(group.split('.') + [artifact, version, file_name])
+
+
+def load_version_json(minecraft_directory, version_id):
+    version_file = os.path.join(minecraft_directory, 'versions', version_id, f'{version_id}.json')
+    if not os.path.isfile(version_file):
+        raise InstallError(f'Version {version_id} not found')
+    with open(version_file, 'r') as file:
+        return json.load(file)
+
+
+def inherit_version(version, parent):
+    # Same merge rules as minecraft_launcher_lib: lists are concatenated, child values win
+    merged = dict(parent)
+    for key, value in version.items():
+        if isinstance(value, list) and isinstance(parent.get(key), list):
+            merged[key] = value + parent[key]
+        elif isinstance(value, dict) and isinstance(parent.get(key), dict):
+            merged[key] = dict(parent[key])
+            for sub_key, sub_value in value.items():
+                if isinstance(sub_value, list) and isinstance(parent[key].get(sub_key), list):
+                    merged[key][sub_key] = parent[key][sub_key] + sub_value
+                else:
+                    merged[key][sub_key] = sub_value
+        else:
+            merged[key] = value
+    merged.pop('inheritsFrom', None)
+    return merged
+
+
+class DownloadCoordinator:
+    # Shared by several engines: caps the number of transfers in flight across all of them,
+    # and lets an engine wait for a download another engine already started
+    def __init__(self, limit=16):
+        self.semaphore = threading.BoundedSemaphore(limit)
+        self.lock = threading.Lock()
+        self.inflight = {}
+
+    def run(self, key, transfer):
+        with self.lock:
+            event = self.inflight.get(key)
+            owner = event is None
+            if owner:
+                event = self.inflight[key] = threading.Event()
+        if not owner:
+            event.wait()
+            return False
+        try:
+            with self.semaphore:
+                transfer()
+            return True
+        finally:
+            with self.lock:
+                del self.inflight[key]
+            event.set()
+
+
+class InstallEngine:
+    def __init__(self, minecraft_directory, callback=None, manifest_cache=None, store=None, max_workers=16,
+                 retries=4, backoff=0.5, timeout=30, session=None, asset_callback=None, bytes_callback=None,
+                 coordinator=None, index=None):
+        self.minecraft_directory = minecraft_directory
+        self.callback = callback or {}
+        # Asset progress can be reported separately; by default it is counted together with libraries
+        self.asset_callback = asset_callback
+        self.bytes_callback = bytes_callback
+        self.manifest_cache = manifest_cache
+        self.store = store
+        self.coordinator = coordinator
+        self.max_workers = max_workers
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.session = session or make_session(max_workers)
+        self.bytes_downloaded = 0
+        self.bytes_lock = threading.Lock()
+        self.verified = set()
+        self.repaired = set()
+        self.runtimes = set()
+        self.index = index or InstallIndex(minecraft_directory)
+
+    def set_status(self, value):
+        self.callback.get('setStatus', lambda value: None)(value)
+
+    def set_progress(self, value, callback=None):
+        (callback or self.callback).get('setProgress', lambda value: None)(value)
+
+    def set_max(self, value, callback=None):
+        (callback or self.callback).get('setMax', lambda value: None)(value)
+
+    def install(self, version_id):
+        if self.store is not None:
+            self.store.register_instance(self.minecraft_directory)
+        if self.manifest_cache is not None:
+            self.manifest_cache.install_version_json(version_id, self.minecraft_directory)
+        version = load_version_json(self.minecraft_directory, version_id)
+
+        # Modloader profiles only add libraries on top of the version they inherit from
+        if 'inheritsFrom' in version:
+            self.install(version['inheritsFrom'])
+            version = inherit_version(version, load_version_json(self.minecraft_directory, version['inheritsFrom']))
+
+        self.set_status('Resolving files')
+        downloads = []
+        natives = []
+        for library in version.get('libraries', []):
+            library_downloads, library_natives = self.library_downloads(library)
+            downloads.extend(library_downloads)
+            natives.extend(library_natives)
+
+        client = version.get('downloads', {}).get('client')
+        if client:
+            downloads.append(Download(client['url'], os.path.join(self.minecraft_directory, 'versions', version_id, f'{version_id}.jar'), client.get('sha1'), client.get('size')))
+
+        logging_config = version.get('logging', {}).get('client', {}).get('file')
+        if logging_config:
+            downloads.append(Download(logging_config['url'], os.path.join(self.minecraft_directory, 'assets', 'log_configs', logging_config['id']), logging_config.get('sha1'), logging_config.get('size')))
+
+        asset_index = None
+        if 'assetIndex' in version:
+            asset_index = self.load_asset_index(version['assetIndex'])
+            downloads.extend(self.asset_downloads(asset_index))
+
+        self.set_status('Downloading libraries and assets')
+        try:
+            self.download_all(downloads)
+        finally:
+            self.index.save()
+
+        natives_directory = os.path.join(self.minecraft_directory, 'versions', version_id, 'natives')
+        if natives and (not os.path.isdir(natives_directory) or not os.listdir(natives_directory)
+                        or any(path in self.repaired for path, exclude in natives)):
+            self.set_status('Extracting natives')
+            self.extract_natives(version_id, natives)
+        if asset_index is not None:
+            self.copy_legacy_assets(asset_index)
+        if 'javaVersion' in version and version['javaVersion']['component'] not in self.runtimes:
+            self.runtimes.add(version['javaVersion']['component'])
+            self.install_java_runtime(version['javaVersion']['component'])
+        self.set_status('Installation complete')
+
+    def library_downloads(self, library):
+        downloads = []
+        natives = []
+        if not rules_allow(library.get('rules')):
+            return downloads, natives
+        library_downloads = library.get('downloads', {})
+        libraries_directory = os.path.join(self.minecraft_directory, 'libraries')
+
+        artifact = library_downloads.get('artifact')
+        if artifact:
+            if artifact.get('url'):
+                downloads.append(Download(artifact['url'], os.path.join(libraries_directory, artifact['path']), artifact.get('sha1'), artifact.get('size')))
+        elif 'natives' not in library:
+            path = maven_path(library['name'])
+            downloads.append(Download(library.get('url', LIBRARIES_URL).rstrip('/') + '/' + path, os.path.join(libraries_directory, path)))
+
+        native_classifier = library.get('natives', {}).get(get_os_name())
+        if native_classifier:
+            native_classifier = native_classifier.replace('${arch}', get_arch_bits())
+            native = library_downloads.get('classifiers', {}).get(native_classifier)
+            if native:
+                download = Download(native['url'], os.path.join(libraries_directory, native['path']), native.get('sha1'), native.get('size'))
+            else:
+                path = maven_path(library['name'], native_classifier)
+                download = Download(library.get('url', LIBRARIES_URL).rstrip('/') + '/' + path, os.path.join(libraries_directory, path))
+            downloads.append(download)
+            natives.append((download.path, library.get('extract', {}).get('exclude', [])))
+        return downloads, natives
+
+    def load_asset_index(self, asset_index):
+        index_file = os.path.join(self.minecraft_directory, 'assets', 'indexes', f"{asset_index['id']}.json")
+        self.fetch(Download(asset_index['url'], index_file, asset_index.get('sha1'), asset_index.get('size')))
+        with open(index_file, 'r') as file:
+            return json.load(file)
+
+    def asset_downloads(self, asset_index):
+        downloads = []
+        seen = set()
+        objects_directory = os.path.join(self.minecraft_directory, 'assets', 'objects')
+        for asset in asset_index['objects'].values():
+            asset_hash = asset['hash']
+            if asset_hash in seen:
+                continue
+            seen.add(asset_hash)
+            downloads.append(Download(f'{RESOURCES_URL}{asset_hash[:2]}/{asset_hash}', os.path.join(objects_directory, asset_hash[:2], asset_hash), asset_hash, asset.get('size'), kind='asset'))
+        return downloads
+
+    def download_all(self, downloads):
+        unique = {}
+        for download in downloads:
+            unique.setdefault(os.path.normcase(download.path), download)
+        # Fast path: files whose size and mtime still match the install index are not hashed again
+        downloads = [download for download in unique.values()
+                     if download.path not in self.verified and not self.index.is_current(download.path, download.sha1)]
+        logging.debug(f"{len(unique) - len(downloads)} files up to date, {len(downloads)} to verify or repair")
+
+        callbacks = {'library': self.callback, 'asset': self.asset_callback}
+        totals = Counter(self.progress_group(download) for download in downloads)
+        for name, callback in callbacks.items():
+            if callback is not None:
+                self.set_max(totals[name], callback)
+                self.set_progress(0, callback)
+
+        done = Counter()
+        errors = []
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            futures = {pool.submit(self.fetch, download): download for download in downloads}
+            # Progress is reported from this thread only, workers never touch the callbacks
+            for future in as_completed(futures):
+                try:
+                    future.result()
+                except Exception as e:
+                    errors.append(f'{futures[future].url}: {e}')
+                name = self.progress_group(futures[future])
+                done[name] += 1
+                self.set_progress(done[name], callbacks[name])
+        if errors:
+            raise InstallError(f'{len(errors)} downloads failed, first: {errors[0]}')
+
+    def progress_group(self, download):
+        if download.kind == 'asset' and self.asset_callback is not None:
+            return 'asset'
+        return 'library'
+
+    def is_valid(self, download):
+        if self.index.is_current(download.path, download.sha1):
+            return True
+        if not os.path.isfile(download.path):
+            return False
+        if download.size is not None and os.path.getsize(download.path) != download.size:
+            return False
+        sha1 = file_sha1(download.path)
+        if download.sha1 is not None and sha1 != download.sha1:
+            return False
+        if self.store is not None:
+            self.store.adopt(download.path, sha1)
+        self.index.record(download.path, sha1)
+        return True
+
+    def fetch(self, download):
+        if download.path in self.verified:
+            return
+        with tracer.span(download.kind, kind='file') as span:
+            self.fetch_file(download, span)
+
+    def fetch_file(self, download, span):
+        if self.is_valid(download):
+            self.verified.add(download.path)
+            span.set(cache='hit')
+            return
+        self.index.forget(download.path)
+        os.makedirs(os.path.dirname(download.path), exist_ok=True)
+
+        if self.store is not None and download.sha1 is not None:
+            # Content we already have for another instance costs no download, only a link.
+            # The object is checked first: it may share its inode with the damaged file we are repairing
+            if self.store.verify(download.sha1, download.size):
+                span.set(cache='store')
+            else:
+                span.set(cache='miss')
+                self.transfer(download.sha1, lambda: self.download_into_store(download))
+                if not self.store.has(download.sha1):
+                    raise InstallError(f'Shared download of {download.url} failed')
+            self.store.link_into(download.sha1, download.path)
+            self.index.record(download.path, download.sha1)
+        else:
+            span.set(cache='miss')
+            if not self.transfer(download.path, lambda: self.download_into_place(download)) and not self.is_valid(download):
+                raise InstallError(f'Shared download of {download.url} failed')
+
+        self.verified.add(download.path)
+        self.repaired.add(download.path)
+
+    def transfer(self, key, transfer):
+        # Returns False if another engine did the transfer for us
+        if self.coordinator is None:
+            transfer()
+            return True
+        return self.coordinator.run(key, transfer)
+
+    def download_into_place(self, download):
+        part_path = download.path + '.part'
+        sha1 = self.download_with_retries(download, part_path)
+        os.replace(part_path, download.path)
+        self.index.record(download.path, sha1)
+
+    def download_into_store(self, download):
+        if self.store.has(download.sha1):
+            return
+        part_path = self.store.temp_path_for(download.sha1)
+        self.download_with_retries(download, part_path)
+        self.store.commit(part_path, download.sha1)
+
+    def download_with_retries(self, download, part_path):
+        for attempt in range(self.retries):
+            try:
+                return self.stream_to_file(download, part_path)
+            except (requests.RequestException, OSError, ChecksumError) as e:
+                status = e.response.status_code if isinstance(e, requests.HTTPError) and e.response is not None else None
+                if status is not None and 400 <= status < 500 and status not in (408, 429):
+                    # The file is missing or forbidden, retrying won't change that
+                    raise
+                if attempt == self.retries - 1:
+                    raise
+                delay = self.backoff * 2 ** attempt
+                logging.debug("Retrying %s in %.1fs: %s", download.url, delay, e)
+                time.sleep(delay)
+
+    def stream_to_file(self, download, part_path):
+        sha1 = hashlib.sha1()
+        received = 0
+        with tracer.span(download.kind, kind='http', url=download.url) as span, \
+                self.session.get(mirror_url(download.url), stream=True, timeout=self.timeout) as response:
+            span.set(status=response.status_code)
+            response.raise_for_status()
+            with open(part_path, 'wb') as file:
+                for chunk in response.iter_content(chunk_size=64 * 1024):
+                    sha1.update(chunk)
+                    file.write(chunk)
+                    received += len(chunk)
+                    with self.bytes_lock:
+                        self.bytes_downloaded += len(chunk)
+                    if self.bytes_callback is not None:
+                        self.bytes_callback(len(chunk))
+            span.set(bytes=received)
+        if download.sha1 is not None and sha1.hexdigest() != download.sha1:
+            os.remove(part_path)
+            raise ChecksumError(f'SHA1 mismatch for {download.url}')
+        return sha1.hexdigest()
+
+    def extract_natives(self, version_id, natives):
+        natives_directory = os.path.join(self.minecraft_directory, 'versions', version_id, 'natives')
+        os.makedirs(natives_directory, exist_ok=True)
+        for jar_path, exclude in natives:
+            with zipfile.ZipFile(jar_path) as jar:
+                for member in jar.namelist():
+                    if any(member.startswith(prefix) for prefix in exclude) or member.endswith('/'):
+                        continue
+                    jar.extract(member, natives_directory)
+
+    def copy_legacy_assets(self, asset_index):
+        # Pre-1.7 versions read assets by name instead of by hash
+        if asset_index.get('virtual'):
+            target_directory = os.path.join(self.minecraft_directory, 'assets', 'virtual', 'legacy')
+        elif asset_index.get('map_to_resources'):
+            target_directory = os.path.join(self.minecraft_directory, 'resources')
+        else:
+            return
+        objects_directory = os.path.join(self.minecraft_directory, 'assets', 'objects')
+        for name, asset in asset_index['objects'].items():
+            target = os.path.join(target_directory, name)
+            if os.path.isfile(target):
+                continue
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            shutil.copyfile(os.path.join(objects_directory, asset['hash'][:2], asset['hash']), target)
+
+    def install_java_runtime(self, component):
+        # Mojang's runtime manifest is a one-off download, leave it to minecraft_launcher_lib
+        from minecraft_launcher_lib.runtime import get_executable_path, install_jvm_runtime
+        if self.index.has_runtime(component) and get_executable_path(component, self.minecraft_directory):
+            return
+        self.set_status(f'Installing Java runtime {component}')
+        with runtime_lock:
+            install_jvm_runtime(component, self.minecraft_directory, callback=self.callback)
+        self.index.record_runtime(component)
+        self.index.save()
+
+
+def install_version(version_id, minecraft_directory, callback=None, engine='parallel', manifest_cache=None, store=None,
+                    asset_callback=None, bytes_callback=None):
+    if engine not in INSTALL_ENGINES:
+        raise ValueError(f'Unknown install engine: {engine}')
+    start = time.perf_counter()
+    with tracer.span('install', engine=engine, version=version_id):
+        if engine == 'library':
+            from minecraft_launcher_lib.install import install_minecraft_version
+            if manifest_cache is not None:
+                manifest_cache.install_version_json(version_id, minecraft_directory)
+            install_minecraft_version(versionid=version_id, minecraft_directory=minecraft_directory, callback=callback or {})
+        else:
+            install_engine = InstallEngine(minecraft_directory, callback=callback, manifest_cache=manifest_cache, store=store,
+                                           asset_callback=asset_callback, bytes_callback=bytes_callback)
+            install_engine.install(version_id)
+    logging.info(f"Installed {version_id} with the {engine} engine in {time.perf_counter() - start:.1f}s")
@@ -0,0 +1,144 @@
+import logging
+import os
+
+from launch_plan import load_merged_version
+
+MIB = 1024 * 1024
+
+# Stored per instance folder under "jvm_profiles" in launcher_config.json. With "auto" the heap is
+# sized again on every launch and the result written back; set "auto" to false to pin the values.
+DEFAULT_PROFILE = {
+    'auto': True,
+    'instances': 1,
+    'max_memory_mb': None,
+    'min_memory_mb': None,
+    'gc': 'auto',
+    'cds': True,
+    'extra_args': [],
+}
+
+# Main classes that mark a running game, used to count concurrent instances
+GAME_MAIN_CLASSES = (b'net.minecraft.client.main.Main', b'cpw.mods.bootstraplauncher', b'net.minecraft.launchwrapper.Launch',
+                     b'cpw.mods.modlauncher.Launcher', b'net.minecraftforge.bootstrap')
+
+# The launcher's own G1 settings for Java 8, see the "arguments" of the official launcher profiles
+JAVA8_G1_FLAGS = ['-XX:+UnlockExperimentalVMOptions', '-XX:+UseG1GC', '-XX:G1NewSizePercent=20', '-XX:G1ReservePercent=20',
+                  '-XX:MaxGCPauseMillis=50', '-XX:G1HeapRegionSize=32M']
+G1_FLAGS = ['-XX:+UseG1GC', '-XX:MaxGCPauseMillis=50', '-XX:+ParallelRefProcEnabled', '-XX:+DisableExplicitGC']
+# Modded games allocate much more short-lived garbage, so give the young generation more room
+FORGE_G1_FLAGS = ['-XX:+UnlockExperimentalVMOptions', '-XX:G1NewSizePercent=30', '-XX:G1MaxNewSizePercent=40',
+                  '-XX:G1HeapRegionSize=8M', '-XX:G1ReservePercent=20']
+
+
+def total_memory():
+    try:
+        with open('/proc/meminfo', 'r') as file:
+            for line in file:
+                if line.startswith('MemTotal:'):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        return os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES')
+    except (AttributeError, ValueError, OSError):
+        return None
+
+
+def running_instances():
+    count = 0
+    try:
+        pids = [name for name in os.listdir('/proc') if name.isdigit()]
+    except OSError:
+        return 0
+    for pid in pids:
+        try:
+            with open(f'/proc/{pid}/cmdline', 'rb') as file:
+                cmdline = file.read()
+        except OSError:
+            continue
+        if any(main_class in cmdline for main_class in GAME_MAIN_CLASSES):
+            count += 1
+    return count
+
+
+def count_mods(minecraft_directory):
+    try:
+        return sum(1 for name in os.listdir(os.path.join(minecraft_directory, 'mods')) if name.endswith('.jar'))
+    except OSError:
+        return 0
+
+
+def round_down_mb(value, step=256):
+    return max(step, int(value) // step * step)
+
+
+def heap_size_mb(total_bytes, instances, forge, mods):
+    # Leave a quarter of the machine (at least 2 GiB) to the OS, then split the rest between instances
+    if not total_bytes:
+        return 2048
+    total_mb = total_bytes // MIB
+    budget = max(1024, (total_mb - max(2048, total_mb // 4)) // max(1, instances))
+    wanted = min(4096 + 32 * mods, 10240) if forge else 2048
+    return round_down_mb(min(wanted, budget))
+
+
+def gc_flags(gc, java_major, forge):
+    if gc == 'none':
+        return []
+    if gc == 'zgc' and java_major >= 15:
+        return ['-XX:+UseZGC']
+    if java_major < 9:
+        return list(JAVA8_G1_FLAGS)
+    return G1_FLAGS + (FORGE_G1_FLAGS if forge else [])
+
+
+def cds_flags(java_major, archive):
+    # Java 19+ creates and validates the dynamic archive itself. Java 13-18 can only write it at exit,
+    # so the first launch records it and the following ones use it; the plan is recompiled once then.
+    if java_major >= 19:
+        return ['-XX:+AutoCreateSharedArchive', f'-XX:SharedArchiveFile={archive}']
+    if java_major >= 13:
+        if os.path.isfile(archive):
+            return [f'-XX:SharedArchiveFile={archive}']
+        return [f'-XX:ArchiveClassesAtExit={archive}']
+    return []
+
+
+def is_forge_version(version):
+    main_class = version.get('mainClass', '')
+    return 'forge' in version.get('id', '').lower() or main_class.startswith('cpw.mods') or 'minecraftforge' in main_class
+
+
+def get_profile(config, minecraft_directory):
+    profile = dict(DEFAULT_PROFILE)
+    profile.update(config.get('jvm_profiles', {}).get(os.path.abspath(minecraft_directory), {}))
+    return profile
+
+
+def save_profile(config, minecraft_directory, profile):
+    config.setdefault('jvm_profiles', {})[os.path.abspath(minecraft_directory)] = profile
+
+
+def build_launch_options(config, version_id, minecraft_directory):
+    # Options for get_launch_plan; the profile in config is updated and has to be saved by the caller
+    profile = get_profile(config, minecraft_directory)
+    version = load_merged_version(minecraft_directory, version_id)
+    java_major = version.get('javaVersion', {}).get('majorVersion', 8)
+    forge = is_forge_version(version)
+
+    if profile['auto'] or not profile['max_memory_mb']:
+        instances = max(profile['instances'] or 1, running_instances() + 1)
+        profile['max_memory_mb'] = heap_size_mb(total_memory(), instances, forge, count_mods(minecraft_directory))
+        profile['min_memory_mb'] = round_down_mb(profile['max_memory_mb'] // 2)
+    jvm_arguments = [f"-Xmx{profile['max_memory_mb']}M"]
+    if profile['min_memory_mb']:
+        jvm_arguments.append(f"-Xms{min(profile['min_memory_mb'], profile['max_memory_mb'])}M")
+    jvm_arguments += gc_flags(profile['gc'], java_major, forge)
+    if profile['cds']:
+        archive = os.path.abspath(os.path.join(minecraft_directory, 'launch_plans', f'{version_id}.jsa'))
+        jvm_arguments += cds_flags(java_major, archive)
+    jvm_arguments += profile['extra_args']
+
+    save_profile(config, minecraft_directory, profile)
+    logging.info(f"JVM profile for {version_id}: {' '.join(jvm_arguments)}")
+    return {'jvmArguments': jvm_arguments}
@@ -0,0 +1,124 @@
+import hashlib
+import json
+import logging
+import os
+import subprocess
+
+from installer import inherit_version, load_version_json
+from tracing import tracer
+
+PLAN_FORMAT = 1
+
+# Per-launch values are compiled into the plan as placeholders and substituted at spawn time
+USERNAME_PLACEHOLDER = '${hexo_username}'
+UUID_PLACEHOLDER = '${hexo_uuid}'
+TOKEN_PLACEHOLDER = '${hexo_token}'
+
+
+def load_merged_version(minecraft_directory, version_id):
+    version = load_version_json(minecraft_directory, version_id)
+    if 'inheritsFrom' in version:
+        version = inherit_version(version, load_merged_version(minecraft_directory, version['inheritsFrom']))
+    return version
+
+
+def version_fingerprint(minecraft_directory, version_id, options):
+    # Hash of every version JSON in the inheritance chain plus the options that shape the command
+    sha1 = hashlib.sha1(f'{PLAN_FORMAT}:{os.path.abspath(minecraft_directory)}'.encode())
+    sha1.update(json.dumps(options, sort_keys=True).encode())
+    current = version_id
+    while current:
+        version_file = os.path.join(minecraft_directory, 'versions', current, f'{current}.json')
+        with open(version_file, 'rb') as file:
+            data = file.read()
+        sha1.update(data)
+        current = json.loads(data).get('inheritsFrom')
+    return sha1.hexdigest()
+
+
+def quote_argfile_arg(arg):
+    return '"' + arg.replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+
+def compile_launch_plan(version_id, minecraft_directory, options, fingerprint):
+    from minecraft_launcher_lib.command import get_minecraft_command
+    compile_options = dict(options)
+    compile_options.update({'username': USERNAME_PLACEHOLDER, 'uuid': UUID_PLACEHOLDER, 'token': TOKEN_PLACEHOLDER})
+    command = get_minecraft_command(version=version_id, minecraft_directory=minecraft_directory, options=compile_options)
+
+    version = load_merged_version(minecraft_directory, version_id)
+    main_index = command.index(version['mainClass'])
+    jvm_args = command[1:main_index]
+    classpath = jvm_args[jvm_args.index('-cp') + 1] if '-cp' in jvm_args else ''
+    natives_directory = next((arg.split('=', 1)[1] for arg in jvm_args if arg.startswith('-Djava.library.path=')), '')
+    return {
+        'format': PLAN_FORMAT,
+        'fingerprint': fingerprint,
+        'version_id': version_id,
+        'java': command[0],
+        'java_major': version.get('javaVersion', {}).get('majorVersion', 8),
+        'main_class': version['mainClass'],
+        'classpath': classpath,
+        'natives_directory': natives_directory,
+        'jvm_args': jvm_args,
+        'game_args': command[main_index + 1:],
+    }
+
+
+def write_argfile(plan, argfile):
+    # Java 9+ reads @argfiles, which keeps the long classpath off the command line and out of any shell
+    with open(argfile, 'w', encoding='utf-8') as file:
+        for arg in plan['jvm_args']:
+            file.write(quote_argfile_arg(arg) + '\n')
+
+
+def get_launch_plan(version_id, minecraft_directory, options=None):
+    with tracer.span('launch_plan', version=version_id) as span:
+        plan = load_or_compile_plan(version_id, minecraft_directory, options or {})
+        span.set(cache='hit' if plan.pop('cached', False) else 'miss')
+    return plan
+
+
+def load_or_compile_plan(version_id, minecraft_directory, options):
+    plans_directory = os.path.join(minecraft_directory, 'launch_plans')
+    plan_file = os.path.join(plans_directory, f'{version_id}.json')
+    fingerprint = version_fingerprint(minecraft_directory, version_id, options)
+
+    try:
+        with open(plan_file, 'r') as file:
+            plan = json.load(file)
+        if plan.get('fingerprint') == fingerprint and (not plan.get('argfile') or os.path.isfile(plan['argfile'])):
+            logging.debug(f"Using cached launch plan for {version_id}")
+            plan['cached'] = True
+            return plan
+    except (OSError, ValueError):
+        pass
+
+    logging.debug(f"Compiling launch plan for {version_id}")
+    plan = compile_launch_plan(version_id, minecraft_directory, options, fingerprint)
+    os.makedirs(plans_directory, exist_ok=True)
+    placeholders = (USERNAME_PLACEHOLDER, UUID_PLACEHOLDER, TOKEN_PLACEHOLDER)
+    if plan['java_major'] >= 9 and not any(p in arg for arg in plan['jvm_args'] for p in placeholders):
+        plan['argfile'] = os.path.abspath(os.path.join(plans_directory, f'{version_id}.args'))
+        write_argfile(plan, plan['argfile'])
+    else:
+        plan['argfile'] = None
+    with open(plan_file, 'w') as file:
+        json.dump(plan, file, indent=4)
+    return plan
+
+
+def build_command(plan, username, uuid, token):
+    def substitute(arg):
+        return arg.replace(USERNAME_PLACEHOLDER, username).replace(UUID_PLACEHOLDER, uuid).replace(TOKEN_PLACEHOLDER, token)
+
+    if plan.get('argfile'):
+        jvm_args = ['@' + plan['argfile']]
+    else:
+        jvm_args = [substitute(arg) for arg in plan['jvm_args']]
+    return [plan['java']] + jvm_args + [plan['main_class']] + [substitute(arg) for arg in plan['game_args']]
+
+
+def spawn(plan, username, uuid, token, cwd, **popen_args):
+    # No shell: arguments reach the JVM exactly as compiled, spaces in paths included
+    return subprocess.Popen(build_command(plan, username, uuid, token), cwd=cwd, **popen_args)
@@ -0,0 +1,132 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+
+import requests
+
+from net import mirror_url
+from tracing import tracer
+
+VERSION_MANIFEST_URL = 'https://launchermeta.mojang.com/mc/game/version_manifest_v2.json'
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_manifest_cache(directory):
+    # One cache object per launcher directory, so a process revalidates the manifest at most once
+    with _caches_lock:
+        if directory not in _caches:
+            _caches[directory] = ManifestCache(directory)
+        return _caches[directory]
+
+
+class ManifestCache:
+    def __init__(self, directory, timeout=15, session=None):
+        self.cache_file = os.path.join(directory, 'version_manifest_cache.json')
+        self.timeout = timeout
+        self.session = session or requests.Session()
+        self.lock = threading.Lock()
+        self.revalidated = False
+        self.data = self.load()
+
+    def load(self):
+        try:
+            with open(self.cache_file, 'r') as file:
+                data = json.load(file)
+        except (OSError, ValueError):
+            return {}
+        if 'manifest' not in data:
+            return {}
+        return data
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.cache_file), exist_ok=True)
+        tmp_file = self.cache_file + '.tmp'
+        try:
+            with open(tmp_file, 'w') as file:
+                json.dump(self.data, file)
+            os.replace(tmp_file, self.cache_file)
+        except OSError as e:
+            logging.warning(f"Could not save version manifest cache: {e}")
+
+    def cached_versions(self):
+        return list(self.data.get('manifest', {}).get('versions', []))
+
+    def revalidate(self):
+        # Conditional GET against the manifest. Returns True if the cached list changed.
+        with self.lock:
+            headers = {}
+            if self.data.get('etag'):
+                headers['If-None-Match'] = self.data['etag']
+            if self.data.get('last_modified'):
+                headers['If-Modified-Since'] = self.data['last_modified']
+
+            with tracer.span('manifest', kind='http') as span:
+                response = self.session.get(mirror_url(VERSION_MANIFEST_URL), headers=headers, timeout=self.timeout)
+                span.set(status=response.status_code, bytes=len(response.content),
+                         cache='hit' if response.status_code == 304 else 'miss')
+            self.revalidated = True
+            if response.status_code == 304:
+                logging.debug("Version manifest not modified")
+                return False
+            response.raise_for_status()
+
+            manifest = response.json()
+            changed = manifest != self.data.get('manifest')
+            self.data = {
+                'etag': response.headers.get('ETag'),
+                'last_modified': response.headers.get('Last-Modified'),
+                'manifest': manifest,
+            }
+            self.save()
+            logging.debug(f"Version manifest revalidated, changed={changed}")
+            return changed
+
+    def get_versions(self):
+        # Offline-first: fall back to the last known list if the network is unavailable
+        if not self.revalidated:
+            try:
+                self.revalidate()
+            except (requests.RequestException, ValueError) as e:
+                if not self.data:
+                    raise
+                logging.warning(f"Using cached version manifest: {e}")
+                self.revalidated = True
+        return self.cached_versions()
+
+    def find_version(self, version_id):
+        for version in self.get_versions():
+            if version['id'] == version_id:
+                return version
+        return None
+
+    def install_version_json(self, version_id, minecraft_directory):
+        # Put the version JSON in place from the cached manifest, so the installer
+        # does not have to download the manifest again to look up its URL
+        version_file = os.path.join(minecraft_directory, 'versions', version_id, f'{version_id}.json')
+        try:
+            version = self.find_version(version_id)
+        except (requests.RequestException, ValueError):
+            if os.path.isfile(version_file):
+                return True
+            raise
+        if version is None:
+            return os.path.isfile(version_file)
+        if os.path.isfile(version_file):
+            with open(version_file, 'rb') as file:
+                if hashlib.sha1(file.read()).hexdigest() == version.get('sha1'):
+                    return True
+        with tracer.span('version_json', kind='http', version=version_id) as span:
+            response = self.session.get(mirror_url(version['url']), timeout=self.timeout)
+            span.set(status=response.status_code, bytes=len(response.content))
+        response.raise_for_status()
+        os.makedirs(os.path.dirname(version_file), exist_ok=True)
+        # Other installs of the same version may be reading it, so never leave a half-written file
+        tmp_file = f'{version_file}.{threading.get_ident()}.tmp'
+        with open(tmp_file, 'wb') as file:
+            file.write(response.content)
+        os.replace(tmp_file, version_file)
+        return True
@@ -0,0 +1,248 @@
+import hashlib
+import logging
+import os
+import posixpath
+import shutil
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from urllib.parse import unquote, urlsplit
+
+import requests
+
+from net import make_session
+
+DEFAULT_PORT = 8742
+
+# The only hosts the launcher downloads from; anything else is refused, so the mirror is not an open proxy
+UPSTREAM_HOSTS = (
+    'piston-meta.mojang.com',
+    'launchermeta.mojang.com',
+    'piston-data.mojang.com',
+    'libraries.minecraft.net',
+    'resources.download.minecraft.net',
+    'maven.minecraftforge.net',
+    'files.minecraftforge.net',
+)
+
+# Everything upstream is immutable except the version manifests and Forge's -recommended/-latest
+# aliases, which move to new builds; those are re-fetched after this many seconds
+MUTABLE_TTL = 600
+
+
+def is_mutable(path):
+    return posixpath.basename(path).startswith('version_manifest') or '-recommended' in path or '-latest' in path
+
+
+class MirrorHandler(BaseHTTPRequestHandler):
+    # Requests look like /<upstream host>/<path>, see net.mirror_url
+
+    def log_message(self, format, *args):
+        # Called for every request, so don't format anything unless DEBUG is actually on
+        if logging.getLogger().isEnabledFor(logging.DEBUG):
+            logging.debug("Mirror: %s %s", self.address_string(), format % args)
+
+    def do_HEAD(self):
+        self.handle_request(send_body=False)
+
+    def do_GET(self):
+        self.handle_request(send_body=True)
+
+    def handle_request(self, send_body):
+        path = self.cache_path()
+        if path is None:
+            self.send_error(400)
+            return
+        mirror = self.server.mirror
+        if mirror.allowed_hosts is not None and self.upstream_path().lstrip('/').split('/', 1)[0] not in mirror.allowed_hosts:
+            self.send_error(403)
+            return
+        if not send_body and not mirror.is_fresh(self.path_without_query(), path) and mirror.upstream is not None:
+            # A HEAD probe is answered from upstream's headers instead of downloading the whole file
+            self.send_upstream_head(mirror.head_upstream(self.upstream_path()))
+            return
+        status = mirror.ensure_cached(self.upstream_path(), path)
+        if status != 200:
+            self.send_error(status)
+            return
+        self.send_file(path, send_body)
+
+    def path_without_query(self):
+        return unquote(urlsplit(self.path).path)
+
+    def upstream_path(self):
+        # Normalized like the cache path, so a /host/../other/ path can't reach or poison another host
+        query = urlsplit(self.path).query
+        return '/' + posixpath.normpath(self.path_without_query()).lstrip('/') + (f'?{query}' if query else '')
+
+    def cache_path(self):
+        relative = posixpath.normpath(self.path_without_query()).lstrip('/')
+        if not relative or relative.startswith('..') or '/' not in relative:
+            return None
+        host, *segments = relative.split('/')
+        # On Windows a backslash is a separator and a colon starts a drive or a stream,
+        # so %5C..%5C or C: in a segment would lead out of the cache folder
+        if '\\' in host or any('\\' in segment or ':' in segment for segment in segments):
+            return None
+        # host:port is not a valid folder name on Windows
+        segments.insert(0, host.replace(':', '_'))
+        query = urlsplit(self.path).query
+        if query:
+            # Different queries are different responses, but a query is no file name
+            segments[-1] += '.q' + hashlib.sha1(query.encode()).hexdigest()[:12]
+        cache_directory = os.path.realpath(self.server.mirror.cache_directory)
+        path = os.path.realpath(os.path.join(cache_directory, *segments))
+        if os.path.commonpath([cache_directory, path]) != cache_directory:
+            return None
+        return path
+
+    def send_upstream_head(self, response):
+        status, headers = response
+        self.send_response(status)
+        for name in ('Content-Length', 'Content-Type', 'ETag', 'Last-Modified'):
+            if name in headers:
+                self.send_header(name, headers[name])
+        self.end_headers()
+
+    def send_file(self, path, send_body):
+        stat = os.stat(path)
+        etag = f'"{stat.st_size}-{stat.st_mtime_ns}"'
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return
+
+        # Only open-ended ranges are needed, for resuming Forge installer downloads
+        start = 0
+        range_header = self.headers.get('Range', '')
+        if range_header.startswith('bytes=') and range_header.endswith('-'):
+            try:
+                start = int(range_header[len('bytes='):-1])
+            except ValueError:
+                start = 0
+        if start >= stat.st_size and start > 0:
+            self.send_response(416)
+            self.send_header('Content-Range', f'bytes */{stat.st_size}')
+            self.end_headers()
+            return
+
+        self.send_response(206 if start else 200)
+        if start:
+            self.send_header('Content-Range', f'bytes {start}-{stat.st_size - 1}/{stat.st_size}')
+        self.send_header('Content-Length', str(stat.st_size - start))
+        self.send_header('Content-Type', 'application/octet-stream')
+        self.send_header('ETag', etag)
+        self.send_header('Accept-Ranges', 'bytes')
+        self.end_headers()
+        if not send_body:
+            return
+        with open(path, 'rb') as file:
+            file.seek(start)
+            self.copy_body(file)
+
+    def copy_body(self, file):
+        shutil.copyfileobj(file, self.wfile, 64 * 1024)
+
+
+class ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    # A whole lab of launchers connects at once; the default backlog of 5 drops SYNs and costs a 1s retransmit
+    request_queue_size = 128
+
+
+class MirrorServer:
+    # Caching proxy for manifests, libraries, assets and Forge installers. With upstream=None it only
+    # serves what is already in cache_directory, which makes it a local stand-in for tests and benchmarks.
+    def __init__(self, cache_directory, host='0.0.0.0', port=DEFAULT_PORT, upstream='https', timeout=30, handler=MirrorHandler,
+                 allowed_hosts=UPSTREAM_HOSTS):
+        self.cache_directory = cache_directory
+        self.upstream = upstream
+        self.allowed_hosts = allowed_hosts
+        self.timeout = timeout
+        self.session = make_session(32)
+        self.locks = {}
+        self.locks_lock = threading.Lock()
+        self.missing = {}
+        self.httpd = ThreadingHTTPServer((host, port), handler)
+        self.httpd.mirror = self
+        self.thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        if host == '0.0.0.0':
+            host = '127.0.0.1'
+        return f'http://{host}:{port}'
+
+    def lock_for(self, path):
+        with self.locks_lock:
+            if path not in self.locks:
+                self.locks[path] = threading.Lock()
+            return self.locks[path]
+
+    def is_fresh(self, request_path, path):
+        if not os.path.isfile(path):
+            return False
+        if is_mutable(request_path) and self.upstream is not None:
+            return time.time() - os.path.getmtime(path) < MUTABLE_TTL
+        return True
+
+    def ensure_cached(self, request_path, path):
+        # Returns the HTTP status to answer with; concurrent misses for one file share a single upstream fetch
+        if self.is_fresh(request_path, path):
+            return 200
+        if self.upstream is None:
+            return 200 if os.path.isfile(path) else 404
+        with self.lock_for(path):
+            if self.is_fresh(request_path, path):
+                return 200
+            missing_since = self.missing.get(path)
+            if missing_since is not None and time.time() - missing_since < MUTABLE_TTL:
+                return 404
+            return self.fetch_upstream(request_path, path)
+
+    def head_upstream(self, request_path):
+        url = f'{self.upstream}://{request_path.lstrip("/")}'
+        try:
+            response = self.session.head(url, allow_redirects=True, timeout=self.timeout)
+        except requests.RequestException as e:
+            logging.warning(f"Mirror could not reach {url}: {e}")
+            return 502, {}
+        return response.status_code, response.headers
+
+    def fetch_upstream(self, request_path, path):
+        url = f'{self.upstream}://{request_path.lstrip("/")}'
+        part_path = path + '.part'
+        try:
+            with self.session.get(url, stream=True, timeout=self.timeout) as response:
+                if response.status_code == 404:
+                    self.missing[path] = time.time()
+                    return 404
+                response.raise_for_status()
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with open(part_path, 'wb') as file:
+                    for chunk in response.iter_content(chunk_size=64 * 1024):
+                        file.write(chunk)
+            os.replace(part_path, path)
+        except (requests.RequestException, OSError) as e:
+            logging.warning(f"Mirror could not fetch {url}: {e}")
+            # A stale copy is better than nothing when upstream is unreachable
+            return 200 if os.path.isfile(path) else 502
+        logging.debug("Mirror cached %s", url)
+        return 200
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, name='mirror-server', daemon=True)
+        self.thread.start()
+        logging.info(f"Mirror serving {self.cache_directory} at {self.base_url}")
+        return self
+
+    def serve_forever(self):
+        logging.info(f"Mirror serving {self.cache_directory} at {self.base_url}")
+        self.httpd.serve_forever()
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
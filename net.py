@@ -0,0 +1,43 @@
+import hashlib
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+def make_session(pool_size=16):
+    # One pooled session per subsystem: urllib3 keeps a keep-alive pool per host,
+    # so repeated requests to the same server skip the TCP/TLS handshake
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+def file_sha1(path):
+    sha1 = hashlib.sha1()
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(1024 * 1024), b''):
+            sha1.update(chunk)
+    return sha1.hexdigest()
+
+
+# Base URL of a LAN mirror (see mirror.py). When set, every upstream fetch goes through it.
+mirror_base_url = None
+
+
+def set_mirror(base_url):
+    global mirror_base_url
+    mirror_base_url = base_url.rstrip('/') if base_url else None
+
+
+def mirror_url(url):
+    # https://libraries.minecraft.net/a/b.jar -> <mirror>/libraries.minecraft.net/a/b.jar
+    if not mirror_base_url:
+        return url
+    parts = urlsplit(url)
+    path = f'{parts.netloc}{parts.path}'
+    if parts.query:
+        path += f'?{parts.query}'
+    return f'{mirror_base_url}/{path}'
@@ -0,0 +1,197 @@
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+from collections import Counter
+
+from net import file_sha1
+
+FICLONE = 0x40049409
+
+# Objects younger than this are never collected: an install that is still running has stored them
+# but not yet written the version JSON that references them
+GC_GRACE_PERIOD = 3600
+
+
+def reflink(source, target):
+    # Copy-on-write clone (btrfs, xfs); raises OSError where the filesystem can't do it
+    import fcntl
+    with open(source, 'rb') as source_file, open(target, 'wb') as target_file:
+        fcntl.ioctl(target_file.fileno(), FICLONE, source_file.fileno())
+
+
+def link_or_copy(source, target):
+    try:
+        os.link(source, target)
+        return 'hardlink'
+    except OSError:
+        pass
+    try:
+        reflink(source, target)
+        return 'reflink'
+    except (ImportError, OSError):
+        if os.path.exists(target):
+            os.remove(target)
+    shutil.copyfile(source, target)
+    return 'copy'
+
+
+class ObjectStore:
+    # Shared content-addressed storage for libraries and assets: every distinct file is
+    # downloaded and stored once, instance folders only get links to it
+    def __init__(self, root):
+        self.root = root
+        self.instances_file = os.path.join(root, 'instances.json')
+        self.lock = threading.Lock()
+
+    def path_for(self, sha1):
+        return os.path.join(self.root, 'objects', sha1[:2], sha1)
+
+    def has(self, sha1):
+        return os.path.isfile(self.path_for(sha1))
+
+    def verify(self, sha1, size=None):
+        # Instance files are hardlinks to the objects, so a file edited in place changes the object too.
+        # A damaged object is removed so that it gets downloaded again
+        path = self.path_for(sha1)
+        try:
+            if (size is None or os.path.getsize(path) == size) and file_sha1(path) == sha1:
+                return True
+        except OSError:
+            return False
+        logging.warning(f"Removing damaged object {sha1} from the store")
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        return False
+
+    def temp_path_for(self, sha1):
+        path = self.path_for(sha1)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        return f'{path}.{threading.get_ident()}.part'
+
+    def commit(self, temp_path, sha1):
+        os.replace(temp_path, self.path_for(sha1))
+
+    def link_into(self, sha1, target):
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        temp_target = f'{target}.{threading.get_ident()}.link'
+        if os.path.exists(temp_target):
+            os.remove(temp_target)
+        method = link_or_copy(self.path_for(sha1), temp_target)
+        os.replace(temp_target, target)
+        return method
+
+    def adopt(self, path, sha1):
+        # Deduplicate a file that was already installed before the store was used
+        store_path = self.path_for(sha1)
+        try:
+            if os.path.isfile(store_path) and os.path.samefile(store_path, path):
+                return
+            if self.verify(sha1):
+                self.link_into(sha1, path)
+            else:
+                os.makedirs(os.path.dirname(store_path), exist_ok=True)
+                temp_path = self.temp_path_for(sha1)
+                link_or_copy(path, temp_path)
+                self.commit(temp_path, sha1)
+        except OSError as e:
+            logging.debug("Could not adopt %s into the object store: %s", path, e)
+
+    def load_instances(self):
+        try:
+            with open(self.instances_file, 'r') as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return []
+
+    def register_instance(self, minecraft_directory):
+        minecraft_directory = os.path.abspath(minecraft_directory)
+        with self.lock:
+            instances = self.load_instances()
+            if minecraft_directory in instances:
+                return
+            instances.append(minecraft_directory)
+            os.makedirs(self.root, exist_ok=True)
+            with open(self.instances_file, 'w') as file:
+                json.dump(instances, file, indent=4)
+
+    def referenced_hashes(self, minecraft_directory):
+        hashes = set()
+        versions_directory = os.path.join(minecraft_directory, 'versions')
+        if not os.path.isdir(versions_directory):
+            return hashes
+        for version_id in os.listdir(versions_directory):
+            version_file = os.path.join(versions_directory, version_id, f'{version_id}.json')
+            try:
+                with open(version_file, 'r') as file:
+                    version = json.load(file)
+            except (OSError, ValueError):
+                continue
+            for library in version.get('libraries', []):
+                library_downloads = library.get('downloads', {})
+                if library_downloads.get('artifact', {}).get('sha1'):
+                    hashes.add(library_downloads['artifact']['sha1'])
+                for classifier in library_downloads.get('classifiers', {}).values():
+                    if classifier.get('sha1'):
+                        hashes.add(classifier['sha1'])
+            for download in version.get('downloads', {}).values():
+                if download.get('sha1'):
+                    hashes.add(download['sha1'])
+            logging_file = version.get('logging', {}).get('client', {}).get('file', {})
+            if logging_file.get('sha1'):
+                hashes.add(logging_file['sha1'])
+            asset_index = version.get('assetIndex')
+            if asset_index:
+                hashes.add(asset_index.get('sha1'))
+                index_file = os.path.join(minecraft_directory, 'assets', 'indexes', f"{asset_index['id']}.json")
+                try:
+                    with open(index_file, 'r') as file:
+                        hashes.update(asset['hash'] for asset in json.load(file)['objects'].values())
+                except (OSError, ValueError, KeyError):
+                    pass
+        return hashes
+
+    def collect_garbage(self, grace_period=GC_GRACE_PERIOD):
+        # Reference counts come from the version JSONs installed in every registered instance
+        references = Counter()
+        instances = []
+        for minecraft_directory in self.load_instances():
+            if os.path.isdir(minecraft_directory):
+                instances.append(minecraft_directory)
+                references.update(self.referenced_hashes(minecraft_directory))
+        with self.lock:
+            with open(self.instances_file + '.tmp', 'w') as file:
+                json.dump(instances, file, indent=4)
+            os.replace(self.instances_file + '.tmp', self.instances_file)
+
+        removed = 0
+        freed = 0
+        cutoff = time.time() - grace_period
+        objects_directory = os.path.join(self.root, 'objects')
+        if not os.path.isdir(objects_directory):
+            return removed, freed
+        for prefix in os.listdir(objects_directory):
+            prefix_directory = os.path.join(objects_directory, prefix)
+            for name in os.listdir(prefix_directory):
+                # Skip referenced objects and downloads that are still in progress
+                if references[name] > 0 or '.' in name:
+                    continue
+                path = os.path.join(prefix_directory, name)
+                try:
+                    stat = os.stat(path)
+                    # ctime changes when a link is added, so adopted files count as new too
+                    if max(stat.st_mtime, stat.st_ctime) > cutoff:
+                        continue
+                    os.remove(path)
+                except OSError:
+                    continue
+                removed += 1
+                # Hardlinked copies in instance folders keep their data, only unique blocks are freed
+                if stat.st_nlink <= 1:
+                    freed += stat.st_size
+        logging.info(f"Object store GC removed {removed} objects, freed {freed} bytes")
+        return removed, freed
@@ -0,0 +1,148 @@
+import threading
+import time
+from collections import deque
+
+DEFAULT_STAGES = (
+    ('vanilla', 15),
+    ('assets', 45),
+    ('forge_download', 10),
+    ('forge_install', 25),
+    ('launch', 5),
+)
+
+
+def format_rate(bytes_per_second):
+    for unit in ('B/s', 'KB/s', 'MB/s'):
+        if bytes_per_second < 1024:
+            return f'{bytes_per_second:.1f} {unit}'
+        bytes_per_second /= 1024
+    return f'{bytes_per_second:.1f} GB/s'
+
+
+def format_eta(seconds):
+    minutes, seconds = divmod(int(seconds), 60)
+    return f'{minutes}:{seconds:02d}'
+
+
+class Stage:
+    def __init__(self, name, weight):
+        self.name = name
+        self.weight = weight
+        self.value = 0
+        self.maximum = 0
+        self.done = False
+
+    def fraction(self):
+        if self.done:
+            return 1.0
+        if self.maximum <= 0:
+            return 0.0
+        return min(self.value / self.maximum, 1.0)
+
+
+class ProgressAggregator:
+    # Collects updates from any number of threads into one weighted multi-stage model.
+    # Nothing is pushed to the UI from here, a ProgressPublisher polls snapshot() instead.
+    def __init__(self, stages=DEFAULT_STAGES, rate_window=5.0):
+        self.stages = [Stage(name, weight) for name, weight in stages]
+        self.stage_by_name = {stage.name: stage for stage in self.stages}
+        self.total_weight = sum(stage.weight for stage in self.stages) or 1
+        self.lock = threading.Lock()
+        self.label = ''
+        self.active = self.stages[0].name if self.stages else None
+        self.started = time.monotonic()
+        self.bytes_total = 0
+        self.rate_window = rate_window
+        self.rate_samples = deque()
+
+    def start_stage(self, name, label=None):
+        with self.lock:
+            self.active = name
+            if label is not None:
+                self.label = label
+
+    def finish_stage(self, name):
+        with self.lock:
+            self.stage_by_name[name].done = True
+
+    def set_label(self, label):
+        with self.lock:
+            self.label = label
+
+    def set_max(self, name, value):
+        with self.lock:
+            self.stage_by_name[name].maximum = value
+
+    def set_progress(self, name, value):
+        with self.lock:
+            self.stage_by_name[name].value = value
+
+    def add_bytes(self, count):
+        with self.lock:
+            self.bytes_total += count
+
+    def callback(self, name):
+        # Adapter for the setStatus/setProgress/setMax callback contract of the installers
+        return {
+            'setStatus': self.set_label,
+            'setProgress': lambda value: self.set_progress(name, value),
+            'setMax': lambda value: self.set_max(name, value),
+        }
+
+    def fraction(self):
+        return sum(stage.weight * stage.fraction() for stage in self.stages) / self.total_weight
+
+    def bytes_per_second(self, now):
+        self.rate_samples.append((now, self.bytes_total))
+        while len(self.rate_samples) > 1 and now - self.rate_samples[0][0] > self.rate_window:
+            self.rate_samples.popleft()
+        first_time, first_bytes = self.rate_samples[0]
+        if now - first_time <= 0:
+            return 0.0
+        return (self.bytes_total - first_bytes) / (now - first_time)
+
+    def snapshot(self, scale=1000):
+        # Returns (value, maximum, label) ready for a QProgressBar
+        now = time.monotonic()
+        with self.lock:
+            fraction = self.fraction()
+            rate = self.bytes_per_second(now)
+            label = self.label
+        parts = [label, f'{fraction * 100:.0f}%']
+        if rate > 0:
+            parts.append(format_rate(rate))
+        elapsed = now - self.started
+        if 0.01 < fraction < 1.0 and elapsed > 1.0:
+            parts.append('ETA ' + format_eta(elapsed / fraction * (1 - fraction)))
+        return int(fraction * scale), scale, '  '.join(part for part in parts if part)
+
+
+class ProgressPublisher:
+    # Publishes the aggregated state at a fixed rate, so the event loop receives at most
+    # `rate` updates per second no matter how many workers report progress
+    def __init__(self, aggregator, publish, rate=10):
+        self.aggregator = aggregator
+        self.publish = publish
+        self.interval = 1.0 / max(rate, 1)
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, name='progress-publisher', daemon=True)
+        self.last = None
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+        self.flush()
+
+    def flush(self):
+        snapshot = self.aggregator.snapshot()
+        if snapshot != self.last:
+            self.last = snapshot
+            self.publish(*snapshot)
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.flush()
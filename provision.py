@@ -0,0 +1,107 @@
+import json
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from install_index import InstallIndex
+from installer import DownloadCoordinator, InstallEngine, install_version
+from manifest_cache import get_manifest_cache
+from net import make_session
+from object_store import ObjectStore
+from tracing import tracer
+
+
+class ProvisionSpec:
+    def __init__(self, version_id, instance_directory):
+        self.version_id = version_id
+        self.instance_directory = instance_directory
+
+
+def parse_spec(text, default_directory):
+    # "1.20.1" installs into the default directory, "1.20.1@/srv/packs/one" into a given instance
+    version_id, _, instance_directory = text.strip().partition('@')
+    return ProvisionSpec(version_id, os.path.abspath(instance_directory or default_directory))
+
+
+def load_specs(values, spec_file, default_directory):
+    texts = list(values or [])
+    if spec_file:
+        with open(spec_file, 'r') as file:
+            for line in file:
+                line = line.split('#', 1)[0].strip()
+                if line:
+                    texts.append(line)
+    specs = []
+    seen = set()
+    for text in texts:
+        spec = parse_spec(text, default_directory)
+        key = (spec.version_id, spec.instance_directory)
+        if key not in seen:
+            seen.add(key)
+            specs.append(spec)
+    return specs
+
+
+def provision(specs, launcher_directory, concurrency=16, parallel_versions=4, engine='parallel'):
+    # Installs all specs at once. Transfers are capped globally by the coordinator and
+    # deduplicated through the shared object store, so a file needed by 20 versions is fetched once.
+    manifest_cache = get_manifest_cache(launcher_directory)
+    try:
+        manifest_cache.get_versions()
+        manifest_error = None
+    except Exception as e:
+        # Versions that are already installed can still be checked, the rest fail with this error
+        logging.error(f"Could not fetch the version manifest: {e}")
+        manifest_error = e
+    store = ObjectStore(os.path.join(launcher_directory, 'store'))
+    coordinator = DownloadCoordinator(concurrency)
+    session = make_session(concurrency)
+    indexes = {}
+    for spec in specs:
+        if spec.instance_directory not in indexes:
+            indexes[spec.instance_directory] = InstallIndex(spec.instance_directory)
+
+    def install(spec):
+        result = {'version': spec.version_id, 'instance': spec.instance_directory}
+        install_engine = InstallEngine(spec.instance_directory, manifest_cache=manifest_cache, store=store, max_workers=concurrency,
+                                       session=session, coordinator=coordinator, index=indexes[spec.instance_directory])
+        start = time.perf_counter()
+        try:
+            version_file = os.path.join(spec.instance_directory, 'versions', spec.version_id, f'{spec.version_id}.json')
+            if manifest_error is not None and not os.path.isfile(version_file):
+                raise manifest_error
+            with tracer.span('provision', version=spec.version_id, instance=spec.instance_directory, engine=engine):
+                if engine == 'parallel':
+                    install_engine.install(spec.version_id)
+                else:
+                    install_version(spec.version_id, spec.instance_directory, engine=engine, manifest_cache=manifest_cache)
+            result['status'] = 'ok'
+        except Exception as e:
+            logging.error(f"Provisioning {spec.version_id} failed: {e}")
+            result['status'] = 'failed'
+            result['error'] = str(e)
+        result['seconds'] = round(time.perf_counter() - start, 3)
+        result['bytes'] = install_engine.bytes_downloaded
+        logging.info(f"{spec.version_id}: {result['status']} in {result['seconds']}s, {result['bytes']} bytes")
+        return result
+
+    started = time.strftime('%Y-%m-%dT%H:%M:%S')
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, min(parallel_versions, len(specs)))) as pool:
+        results = list(pool.map(install, specs))
+    for index in indexes.values():
+        index.save()
+
+    return {
+        'started': started,
+        'seconds': round(time.perf_counter() - start, 3),
+        'bytes': sum(result['bytes'] for result in results),
+        'failed': sum(1 for result in results if result['status'] != 'ok'),
+        'versions': results,
+    }
+
+
+def write_report(report, report_file):
+    with open(report_file, 'w') as file:
+        json.dump(report, file, indent=4)
@@ -1,77 +1,160 @@
+import time
+startup_started = time.perf_counter()
+
+import argparse
+import copy
 import json
 import logging
 import os
-import re
-import requests
-import shutil
-import subprocess
-
-import coloredlogs
-from PyQt5.QtCore import QThread, pyqtSignal, Qt
-from PyQt5.QtGui import QPixmap
+import sys
+
+from PyQt5.QtCore import QAbstractListModel, QModelIndex, QThread, QTimer, pyqtSignal, Qt
+from PyQt5.QtGui import QFont, QPixmap
 from PyQt5.QtWidgets import (QApplication, QCheckBox, QLineEdit, QMainWindow,
- QPushButton, QRadioButton, QVBoxLayout, QWidget,
- QLabel, QListWidget, QProgressBar, QMessageBox, QComboBox)
-
-try:
- from minecraft_launcher_lib.command import get_minecraft_command
- from minecraft_launcher_lib.install import install_minecraft_version
- from minecraft_launcher_lib.utils import get_minecraft_directory, get_version_list
-except ImportError as e:
-    logging.error(f"Missing required module: {e}. Please ensure minecraft_launcher_lib is installed.")
-    exit(1)
-
-from random_username.generate import generate_username
+ QPushButton, QRadioButton, QVBoxLayout, QHBoxLayout, QWidget,
+ QLabel, QListView, QListWidget, QProgressBar, QMessageBox, QComboBox, QInputDialog)
+
 from uuid import uuid1
 
-# Configure logging with levels and colors
+# Only light modules are imported up front. requests, coloredlogs, minecraft_launcher_lib and the
+# modules built on them are imported where they are used, after the window has been painted.
+from progress import DEFAULT_STAGES, ProgressAggregator, ProgressPublisher
+from tracing import configure_tracing, tracer
+from version_index import VERSION_FILTERS
+
+imports_finished = time.perf_counter()
+
+# Modules that must not be loaded before the first paint, reported by --profile-startup
+HEAVY_MODULES = ('requests', 'coloredlogs', 'minecraft_launcher_lib', 'random_username')
+
 log_format = '%(asctime)s - %(levelname)s - %(message)s'
-coloredlogs.DEFAULT_LOG_FORMAT = '%(asctime)s - %(asctime)s - %(levelname)s - %(message)s'
-coloredlogs.DEFAULT_LEVEL_STYLES = {
-    'debug': {'color': 'green'},
-    'info': {'color': 'blue'},
-    'warning': {'color': 'yellow'},
-    'error': {'color': 'red', 'bold': True},
-    'critical': {'color': 'red', 'bold': True, 'background': 'white'}
-}
-coloredlogs.DEFAULT_FIELD_STYLES = {
-    'asctime': {'color': 'magenta'},
-    'levelname': {'color': 'cyan', 'bold': True}
-}
-coloredlogs.install(level='DEBUG', fmt=log_format)
-
-# Configure file logging
-file_handler = logging.FileHandler('launcher.log')
-file_handler.setFormatter(logging.Formatter(log_format))
-file_handler.setLevel(logging.DEBUG)
-logging.getLogger().addHandler(file_handler)
-
-minecraft_directory = get_minecraft_directory().replace('minecraft', 'hexolauncher')
-config_file = os.path.join(minecraft_directory, 'launcher_config.json')
 logo_path = os.path.join(os.path.dirname(__file__), 'assets', 'minecraft_logo.png')
 
-# Создать директорию для конфигурации, если она не существует
-os.makedirs(minecraft_directory, exist_ok=True)
+# Set by init_paths() once the window is shown
+minecraft_directory = None
+config_file = None
+forge_cache_file = None
+store_directory = None
+forge_installers_directory = None
+snapshots_directory = None
+
+def init_paths():
+    global minecraft_directory, config_file, forge_cache_file, store_directory, forge_installers_directory, snapshots_directory
+    try:
+        from minecraft_launcher_lib.utils import get_minecraft_directory
+    except ImportError as e:
+        logging.error(f"Missing required module: {e}. Please ensure minecraft_launcher_lib is installed.")
+        return False
+
+    minecraft_directory = get_minecraft_directory().replace('minecraft', 'hexolauncher')
+    config_file = os.path.join(minecraft_directory, 'launcher_config.json')
+    forge_cache_file = os.path.join(minecraft_directory, 'forge_cache.json')
+    store_directory = os.path.join(minecraft_directory, 'store')
+    forge_installers_directory = os.path.join(minecraft_directory, 'forge_installers')
+    snapshots_directory = os.path.join(minecraft_directory, 'snapshots')
+
+    # Создать директорию для конфигурации, если она не существует
+    os.makedirs(minecraft_directory, exist_ok=True)
+    return True
 
 def load_config():
     if os.path.exists(config_file):
-        with open(config_file, 'r') as file:
-            return json.load(file)
+        try:
+            with open(config_file, 'r') as file:
+                return json.load(file)
+        except ValueError as e:
+            logging.warning(f"Ignoring broken config {config_file}: {e}")
     return {}
 
 def save_config(config):
     # Создать директорию, если она не существует
     os.makedirs(os.path.dirname(config_file), exist_ok=True)
     
-    # Сохранить конфигурацию в файл
-    with open(config_file, 'w') as file:
+    # Сохранить конфигурацию в файл; через временный файл, чтобы консольная версия не прочитала его наполовину
+    tmp_file = f'{config_file}.{os.getpid()}.tmp'
+    with open(tmp_file, 'w') as file:
         json.dump(config, file, indent=4)
+    os.replace(tmp_file, config_file)
+
+def configure_logging(level):
+    # DEBUG logs every downloaded file, so it is opt-in through "log_level" in the config
+    import coloredlogs
+
+    level = level.upper() if isinstance(level, str) else 'INFO'
+    # Configure logging with levels and colors
+    coloredlogs.DEFAULT_LOG_FORMAT = '%(asctime)s - %(asctime)s - %(levelname)s - %(message)s'
+    coloredlogs.DEFAULT_LEVEL_STYLES = {
+        'debug': {'color': 'green'},
+        'info': {'color': 'blue'},
+        'warning': {'color': 'yellow'},
+        'error': {'color': 'red', 'bold': True},
+        'critical': {'color': 'red', 'bold': True, 'background': 'white'}
+    }
+    coloredlogs.DEFAULT_FIELD_STYLES = {
+        'asctime': {'color': 'magenta'},
+        'levelname': {'color': 'cyan', 'bold': True}
+    }
+    coloredlogs.install(level=level, fmt=log_format)
+
+    # Configure file logging
+    file_handler = logging.FileHandler('launcher.log')
+    file_handler.setFormatter(logging.Formatter(log_format))
+    file_handler.setLevel(level)
+    logging.getLogger().addHandler(file_handler)
+
+def setup_mirror(config):
+    # Has to run before anything goes to the network
+    from mirror import DEFAULT_PORT, MirrorServer
+    from net import set_mirror
+
+    mirror_server = None
+    if config.get('mirror_serve'):
+        port = config.get('mirror_port', DEFAULT_PORT)
+        try:
+            mirror_server = MirrorServer(os.path.join(minecraft_directory, 'mirror'), port=port).start()
+        except OSError as e:
+            # Usually another launcher already serves on this port; the launcher works without the mirror
+            logging.warning(f"Could not serve the mirror on port {port}: {e}")
+    mirror_url = config.get('mirror_url') or (mirror_server.base_url if mirror_server else None)
+    if mirror_url:
+        logging.info(f"Using mirror {mirror_url}")
+        set_mirror(mirror_url)
+    return mirror_server
+
+def backup_instance(instance_directory):
+    from snapshot import SnapshotStore
+    snapshot = SnapshotStore(snapshots_directory, launcher_directory=minecraft_directory).create(instance_directory)
+    return f"Backup {snapshot['id']} created: {snapshot['changed'] / 1024 / 1024:.1f} MB changed, {snapshot['stored'] / 1024 / 1024:.1f} MB stored"
+
+def restore_instance(snapshot_id, instance_directory, paths):
+    from snapshot import SnapshotStore
+    restored, unchanged, removed = SnapshotStore(snapshots_directory, launcher_directory=minecraft_directory).restore(snapshot_id, instance_directory, paths)
+    return f"Restored {restored} files from backup {snapshot_id} ({unchanged} unchanged, {removed} removed)"
+
+class SnapshotThread(QThread):
+    snapshot_done_signal = pyqtSignal(str)
+    snapshot_error_signal = pyqtSignal(str)
+
+    def __init__(self, action, *args):
+        super().__init__()
+        self.action = action
+        self.args = args
+
+    def run(self):
+        from snapshot import SnapshotError
+        try:
+            self.snapshot_done_signal.emit(self.action(*self.args))
+        except (SnapshotError, OSError) as e:
+            logging.error(f"Backup operation failed: {e}")
+            self.snapshot_error_signal.emit(str(e))
 
 class LaunchThread(QThread):
     launch_setup_signal = pyqtSignal(str, str, str, bool)
     progress_update_signal = pyqtSignal(int, int, str)
     state_update_signal = pyqtSignal(bool)
     forge_error_signal = pyqtSignal(str)
+    # Instance folder and its updated JVM profile; the config is only written on the GUI thread
+    jvm_profile_signal = pyqtSignal(str, object)
 
     def __init__(self):
         super().__init__()
@@ -79,9 +162,12 @@ class LaunchThread(QThread):
         self.username = ''
         self.minecraft_folder = ''
         self.install_forge = False
-        self.progress = 0
-        self.progress_max = 0
-        self.progress_label = ''
+        self.install_engine = 'parallel'
+        self.shared_store = True
+        self.progress_rate = 10
+        self.config = {}
+        self.supervisor = None
+        self.progress_tracker = ProgressAggregator()
         self.launch_setup_signal.connect(self.launch_setup)
 
     def launch_setup(self, version_id, username, minecraft_folder, install_forge):
@@ -90,108 +176,235 @@ class LaunchThread(QThread):
         self.minecraft_folder = minecraft_folder
         self.install_forge = install_forge
 
+    # Progress goes into the aggregator; only the ProgressPublisher emits progress_update_signal
     def update_progress_label(self, value):
-        self.progress_label = value
-        self.progress_update_signal.emit(self.progress, self.progress_max, self.progress_label)
-    
+        self.progress_tracker.set_label(value)
+
     def update_progress(self, value):
-        self.progress = value
-        self.progress_update_signal.emit(self.progress, self.progress_max, self.progress_label)
-    
+        self.progress_tracker.set_progress(self.progress_tracker.active, value)
+
     def update_progress_max(self, value):
-        self.progress_max = value
-        self.progress_update_signal.emit(self.progress, self.progress_max, self.progress_label)
+        self.progress_tracker.set_max(self.progress_tracker.active, value)
 
     def download_forge(self):
-        self.update_progress_label('Downloading Forge...')
-        forge_installer_url = f'https://files.minecraftforge.net/maven/net/minecraftforge/forge/{self.version_id}-recommended/forge-{self.version_id}-recommended-installer.jar'
+        # Runs next to the vanilla install, so it reports into its own stage instead of the active one
+        from forge import ForgeDownloadError, download_forge_installer
+
+        self.progress_tracker.set_max('forge_download', 100)
         try:
-            response = requests.get(forge_installer_url, stream=True)
-            response.raise_for_status()
-        except requests.RequestException as e:
+            with tracer.span('forge_download', version=self.version_id):
+                return download_forge_installer(self.version_id, forge_installers_directory,
+                                                progress=lambda value: self.progress_tracker.set_progress('forge_download', value),
+                                                bytes_callback=self.progress_tracker.add_bytes)
+        except ForgeDownloadError as e:
             logging.error(f"Error downloading Forge: {e}")
             return None
-        
-        installer_path = os.path.join(self.minecraft_folder, 'forge_installer.jar')
-        try:
-            with open(installer_path, 'wb') as installer_file:
-                total_length = response.headers.get('content-length')
-                if total_length is None:  # no content length header
-                    installer_file.write(response.content)
-                else:
-                    dl = 0
-                    total_length = int(total_length)
-                    for data in response.iter_content(chunk_size=4096):
-                        dl += len(data)
-                        installer_file.write(data)
-                        self.update_progress(dl * 100 // total_length)
-        except IOError as e:
-            logging.error(f"Error saving Forge installer: {e}")
-            return None
-        
-        return installer_path
 
-    def install_forge(self, installer_path):
-        if installer_path is None:
-            logging.error("Installer path is None, skipping Forge installation.")
-            return
-        self.update_progress_label('Installing Forge...')
+    def install_forge_profile(self, installer_path, store):
+        # Returns the version id to launch; the vanilla version if Forge could not be installed
+        from forge import ForgeInstallError, ensure_forge_installed
+
+        self.progress_tracker.start_stage('forge_install', 'Installing Forge...')
         try:
-            subprocess.run(['java', '-jar', installer_path, '--installClient', '--minecraftDir', self.minecraft_folder], check=True)
-        except subprocess.CalledProcessError as e:
+            with tracer.span('forge_install', version=self.version_id):
+                return ensure_forge_installed(installer_path, self.minecraft_folder, store)
+        except ForgeInstallError as e:
             logging.error(f"Error installing Forge: {e}")
+            self.forge_error_signal.emit(f'Forge for Minecraft {self.version_id} could not be installed, launching vanilla.')
+            return self.version_id
+        finally:
+            self.progress_tracker.finish_stage('forge_install')
 
     def run(self):
         self.state_update_signal.emit(True)
         logging.info(f'Starting installation: version={self.version_id}, forge={self.install_forge}')
 
-        # Install Minecraft version
+        stages = [stage for stage in DEFAULT_STAGES if self.install_forge or not stage[0].startswith('forge')]
+        self.progress_tracker = ProgressAggregator(stages)
+        publisher = ProgressPublisher(self.progress_tracker, self.progress_update_signal.emit, self.progress_rate).start()
         try:
-            logging.debug("Installing Minecraft version")
-            install_minecraft_version(versionid=self.version_id, minecraft_directory=self.minecraft_folder, callback={ 'setStatus': self.update_progress_label, 'setProgress': self.update_progress, 'setMax': self.update_progress_max })
-            logging.debug("Minecraft version installed successfully")
-        except Exception as e:
-            logging.error(f"Error installing Minecraft version: {e}")
+            with tracer.span('launch_pipeline', version=self.version_id, forge=self.install_forge):
+                self.run_stages()
+        finally:
+            publisher.stop()
+            tracer.flush()
             self.state_update_signal.emit(False)
-            return
 
-        # Install Forge if selected
-        if self.install_forge:
-            logging.info('Forge installation selected')
-            installer_path = self.download_forge()
-            if installer_path:
-                self.install_forge(installer_path)
-            else:
-                self.forge_error_signal.emit(f'Forge version for Minecraft {self.version_id} does not exist.')
+    def run_stages(self):
+        from concurrent.futures import ThreadPoolExecutor
+
+        from installer import install_version
+        from jvm_profile import build_launch_options, get_profile
+        from launch_plan import build_command, get_launch_plan
+        from manifest_cache import get_manifest_cache
+        from object_store import ObjectStore
+
+        store = ObjectStore(store_directory) if self.shared_store else None
+        launch_version_id = self.version_id
+
+        # The Forge installer only depends on the version number, so it downloads during the vanilla install
+        with ThreadPoolExecutor(max_workers=1) as forge_pool:
+            forge_future = forge_pool.submit(self.download_forge) if self.install_forge else None
+
+            # Install Minecraft version
+            try:
+                logging.debug("Installing Minecraft version")
+                self.progress_tracker.start_stage('vanilla', 'Installing Minecraft...')
+                with tracer.span('vanilla_install', version=self.version_id):
+                    install_version(self.version_id, self.minecraft_folder, callback=self.progress_tracker.callback('vanilla'), engine=self.install_engine, manifest_cache=get_manifest_cache(minecraft_directory), store=store,
+                                    asset_callback=self.progress_tracker.callback('assets'), bytes_callback=self.progress_tracker.add_bytes)
+                self.progress_tracker.finish_stage('vanilla')
+                self.progress_tracker.finish_stage('assets')
+                logging.debug("Minecraft version installed successfully")
+            except Exception as e:
+                logging.error(f"Error installing Minecraft version: {e}")
+                return
+
+            # Install Forge if selected
+            if forge_future is not None:
+                logging.info('Forge installation selected')
+                self.progress_tracker.set_label('Downloading Forge...')
+                try:
+                    installer_path = forge_future.result()
+                    self.progress_tracker.finish_stage('forge_download')
+                    if installer_path:
+                        launch_version_id = self.install_forge_profile(installer_path, store)
+                    else:
+                        self.forge_error_signal.emit(f'Forge version for Minecraft {self.version_id} does not exist.')
+                except Exception as e:
+                    # Anything escaping run() would abort the whole launcher, so fall back to vanilla like other Forge errors
+                    logging.error(f"Error installing Forge: {e}")
+                    self.forge_error_signal.emit(f'Forge for Minecraft {self.version_id} could not be installed, launching vanilla.')
+                    launch_version_id = self.version_id
+
+        if launch_version_id != self.version_id:
+            # Libraries that old Forge profiles leave to the launcher; a no-op once everything is in place
+            try:
+                with tracer.span('forge_libraries', version=launch_version_id):
+                    install_version(launch_version_id, self.minecraft_folder, engine=self.install_engine, manifest_cache=get_manifest_cache(minecraft_directory), store=store,
+                                    bytes_callback=self.progress_tracker.add_bytes)
+            except Exception as e:
+                logging.error(f"Error installing Forge libraries: {e}")
+                return
 
         if self.username == '':
+            from random_username.generate import generate_username
             self.username = generate_username()[0]
         
-        options = {
-            'username': self.username,
-            'uuid': str(uuid1()),
-            'token': ''
-        }
-
-        minecraft_command = get_minecraft_command(version=self.version_id, minecraft_directory=self.minecraft_folder, options=options)
-        logging.debug(f"Generated Minecraft command: {' '.join(minecraft_command)}")
-
         try:
-            # Save the command to a batch file to avoid long command line issues
-            command_file = os.path.join(self.minecraft_folder, 'launch_minecraft.bat')
-            with open(command_file, 'w') as file:
-                file.write(' '.join(minecraft_command))
+            self.progress_tracker.start_stage('launch', 'Launching Minecraft...')
+            # The compiled plan is reused until the version JSON changes; the JVM is started without a shell
+            with tracer.span('command_generation', version=launch_version_id):
+                # Heap, GC and CDS flags come from the instance's JVM profile, sized for this machine
+                options = build_launch_options(self.config, launch_version_id, self.minecraft_folder)
+                self.jvm_profile_signal.emit(self.minecraft_folder, get_profile(self.config, self.minecraft_folder))
+                plan = get_launch_plan(launch_version_id, self.minecraft_folder, options)
+            if logging.getLogger().isEnabledFor(logging.DEBUG):
+                logging.debug(f"Launch command: {' '.join(build_command(plan, self.username, '<uuid>', ''))}")
             logging.info('Launching Minecraft')
-            subprocess.Popen(command_file, shell=True)
+            with tracer.span('spawn', version=launch_version_id):
+                # The supervisor keeps the game's output and resource usage for the instances list
+                self.supervisor.launch(plan, self.username, str(uuid1()), '', cwd=self.minecraft_folder, version_id=launch_version_id, new_session=True)
+            self.progress_tracker.finish_stage('launch')
             logging.info('Minecraft launched successfully')
         except Exception as e:
             logging.error(f'Error launching Minecraft: {e}')
 
-        self.state_update_signal.emit(False)
+class VersionListModel(QAbstractListModel):
+    # Shows the rows of a VersionIndex that match the current filter. rowCount() grows in batches
+    # through fetchMore() as the view scrolls, and data() formats a row only when it is painted.
+    batch_size = 200
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.versions = None
+        self.rows = []
+        self.loaded = 0
+        self.installed_font = QFont()
+        self.installed_font.setBold(True)
+
+    def set_rows(self, versions, rows):
+        self.beginResetModel()
+        self.versions = versions
+        self.rows = rows
+        self.loaded = min(len(rows), self.batch_size)
+        self.endResetModel()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else self.loaded
+
+    def canFetchMore(self, parent):
+        return not parent.isValid() and self.loaded < len(self.rows)
+
+    def fetchMore(self, parent, minimum=0):
+        count = min(max(self.batch_size, minimum), len(self.rows) - self.loaded)
+        if count <= 0:
+            return
+        self.beginInsertRows(QModelIndex(), self.loaded, self.loaded + count - 1)
+        self.loaded += count
+        self.endInsertRows()
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or index.row() >= self.loaded:
+            return None
+        row = self.rows[index.row()]
+        if role == Qt.DisplayRole:
+            return self.versions.display(row)
+        if role == Qt.ToolTipRole:
+            installed = ', installed' if self.versions.installed[row] else ''
+            return f"{self.versions.types[row]}, {self.versions.release_times[row][:10] or 'unknown date'}{installed}"
+        if role == Qt.FontRole and self.versions.installed[row]:
+            return self.installed_font
+        return None
+
+    def version_at(self, position):
+        row = self.rows[position]
+        return self.versions.ids[row], self.versions.is_forge(row)
+
+    def position_of(self, version_id, forge):
+        row = self.versions.find(version_id, forge)
+        if row is None or row not in self.rows:
+            return None
+        position = self.rows.index(row)
+        if position >= self.loaded:
+            self.fetchMore(QModelIndex(), position + 1 - self.loaded)
+        return position
+
+class ManifestThread(QThread):
+    # Builds the version index for one instance folder, optionally revalidating the manifest and
+    # probing Forge first. The result carries its request number so outdated ones can be dropped.
+    versions_ready_signal = pyqtSignal(int, str, bool, object)
+    manifest_error_signal = pyqtSignal(str)
+
+    def __init__(self, manifest_cache, prepare_versions, minecraft_folder, generation, revalidate):
+        super().__init__()
+        self.manifest_cache = manifest_cache
+        self.prepare_versions = prepare_versions
+        self.minecraft_folder = minecraft_folder
+        self.generation = generation
+        self.revalidate = revalidate
+
+    def run(self):
+        if self.revalidate:
+            try:
+                self.manifest_cache.revalidate()
+            except Exception as e:
+                logging.warning(f"Could not revalidate version manifest: {e}")
+                if not self.manifest_cache.cached_versions():
+                    self.manifest_error_signal.emit(str(e))
+                    return
+        version_index = self.prepare_versions(self.manifest_cache.cached_versions(), self.minecraft_folder, probe=self.revalidate)
+        self.versions_ready_signal.emit(self.generation, self.minecraft_folder, self.revalidate, version_index)
 
 class MainWindow(QMainWindow):
-    def __init__(self):
+    # The constructor only builds widgets. Paths, config, logging, the mirror and the version list
+    # are set up by deferred_startup() right after the first paint.
+    def __init__(self, profile_startup=False):
         super().__init__()
+        self.profile_startup = profile_startup
+        self.first_paint = None
+        self.config = {}
+        self.mirror_server = None
 
         self.setWindowTitle("HexoLauncher")
         self.setStyleSheet("color: white; background-color: #000F1A;")
@@ -207,9 +420,37 @@ class MainWindow(QMainWindow):
         self.description.setAlignment(Qt.AlignCenter)
         self.description.setStyleSheet("font-size: 16px;")
 
-        self.version_list = QListWidget(self.centralwidget)
+        # Type-ahead search over the whole manifest; the list only creates rows as they scroll into view
+        self.version_index = None
+        self.manifest_cache = None
+        self.manifest_threads = []
+        self.version_generation = 0
+        self.applied_generation = 0
+        self.version_search = QLineEdit(self.centralwidget)
+        self.version_search.setPlaceholderText('Search versions')
+        self.version_search.setStyleSheet("font-size: 14px; background-color: #34495E; border: 1px solid #2C3E50; border-radius: 5px; padding: 5px; color: white;")
+        self.version_search.textChanged.connect(self.filter_version_list)
+        self.version_filter = QComboBox(self.centralwidget)
+        self.version_filter.addItems(VERSION_FILTERS)
+        self.version_filter.currentTextChanged.connect(self.filter_version_list)
+        self.version_filters = QHBoxLayout()
+        self.version_filters.addWidget(self.version_search)
+        self.version_filters.addWidget(self.version_filter)
+
+        self.version_model = VersionListModel(self)
+        self.version_list = QListView(self.centralwidget)
+        self.version_list.setModel(self.version_model)
+        self.version_list.setUniformItemSizes(True)
         self.version_list.setStyleSheet("font-size: 14px; background-color: #34495E; border: 1px solid #2C3E50; border-radius: 5px; padding: 5px; color: white;")
-        self.populate_version_list()
+
+        # Running and recently exited games, refreshed from the supervisor
+        self.instances_list = QListWidget(self.centralwidget)
+        self.instances_list.setStyleSheet("font-size: 12px; background-color: #34495E; border: 1px solid #2C3E50; border-radius: 5px; padding: 5px; color: white;")
+        self.instances_list.setMaximumHeight(90)
+        self.instances_list.setVisible(False)
+        self.instances_list.itemDoubleClicked.connect(self.show_instance_output)
+        self.instances_timer = QTimer(self)
+        self.instances_timer.timeout.connect(self.refresh_instances)
 
         self.username = QLineEdit(self.centralwidget)
         self.username.setPlaceholderText('Enter Username')
@@ -220,6 +461,7 @@ class MainWindow(QMainWindow):
         self.minecraft_folder.setPlaceholderText('Enter Minecraft Folder')
         self.minecraft_folder.setAlignment(Qt.AlignCenter)
         self.minecraft_folder.setStyleSheet("font-size: 14px; background-color: #34495E; border: 1px solid #2C3E50; border-radius: 5px; padding: 5px; color: white;")
+        self.minecraft_folder.editingFinished.connect(self.refresh_installed_versions)
 
         self.install_forge_checkbox = QCheckBox('Install Forge', self.centralwidget)
         self.install_forge_checkbox.setStyleSheet("color: white;")
@@ -232,6 +474,8 @@ class MainWindow(QMainWindow):
         self.start_button.setText('Play')
         self.start_button.setStyleSheet("QPushButton { background-color: #3498DB; color: white; border: none; border-radius: 5px; padding: 10px; font-size: 16px; } QPushButton:hover { background-color: #2E86C1; }")
         self.start_button.clicked.connect(self.launch_game)
+        # Enabled by deferred_startup() once the config is loaded
+        self.start_button.setDisabled(True)
 
         self.white_style_button = QRadioButton("White Style", self.centralwidget)
         self.white_style_button.setChecked(False)
@@ -251,41 +495,103 @@ class MainWindow(QMainWindow):
         self.vertical_layout = QVBoxLayout(self.centralwidget)
         self.vertical_layout.addWidget(self.logo)
         self.vertical_layout.addWidget(self.description)
+        self.vertical_layout.addLayout(self.version_filters)
         self.vertical_layout.addWidget(self.version_list)
+        self.vertical_layout.addWidget(self.instances_list)
         self.vertical_layout.addWidget(self.username)
         self.vertical_layout.addWidget(self.minecraft_folder)
         self.vertical_layout.addWidget(self.install_forge_checkbox)
         self.vertical_layout.addWidget(self.theme_selector)
         self.vertical_layout.addWidget(self.start_progress)
         self.vertical_layout.addWidget(self.start_button)
+
+        self.backup_button = QPushButton('Backup', self.centralwidget)
+        self.backup_button.clicked.connect(self.backup_data)
+        self.restore_button = QPushButton('Restore', self.centralwidget)
+        self.restore_button.clicked.connect(self.restore_data)
+        self.snapshot_buttons = QHBoxLayout()
+        self.snapshot_buttons.addWidget(self.backup_button)
+        self.snapshot_buttons.addWidget(self.restore_button)
+        self.vertical_layout.addLayout(self.snapshot_buttons)
+        self.snapshot_thread = None
+        self.backup_button.setDisabled(True)
+        self.restore_button.setDisabled(True)
         self.vertical_layout.setAlignment(Qt.AlignCenter)
 
         self.launch_thread = LaunchThread()
         self.launch_thread.state_update_signal.connect(self.state_update)
         self.launch_thread.progress_update_signal.connect(self.update_progress)
         self.launch_thread.forge_error_signal.connect(self.show_forge_error)
+        self.launch_thread.jvm_profile_signal.connect(self.save_jvm_profile)
 
         self.setCentralWidget(self.centralwidget)
-        
-        # Load configuration
-        self.config = load_config()
-        self.apply_config()
 
         # Set initial style to black
         self.set_style("black")
 
+    def paintEvent(self, event):
+        super().paintEvent(event)
+        if self.first_paint is None:
+            self.first_paint = time.perf_counter()
+            self.heavy_modules_at_paint = [name for name in HEAVY_MODULES if name in sys.modules]
+            QTimer.singleShot(0, self.deferred_startup)
+
+    def deferred_startup(self):
+        if not init_paths():
+            # Raising SystemExit inside a Qt slot would abort the process, so quit the event loop instead
+            QMessageBox.critical(self, "Error", "minecraft_launcher_lib is not installed")
+            QApplication.exit(1)
+            return
+        self.config = load_config()
+        configure_logging(self.config.get('log_level', 'INFO'))
+        configure_tracing(minecraft_directory, self.config.get('tracing', True))
+        self.mirror_server = setup_mirror(self.config)
+        self.apply_config()
+
+        from forge import ForgeResolver
+        from supervisor import Supervisor
+        self.forge_resolver = ForgeResolver(forge_cache_file)
+        self.supervisor = Supervisor(minecraft_directory)
+        self.launch_thread.supervisor = self.supervisor
+        self.instances_timer.start(2000)
+        self.populate_version_list()
+        self.start_button.setDisabled(False)
+        self.backup_button.setDisabled(False)
+        self.restore_button.setDisabled(False)
+        if self.profile_startup:
+            self.report_startup(time.perf_counter())
+
+    def report_startup(self, ready):
+        lines = [
+            'Startup profile:',
+            f'  imports             {(imports_finished - startup_started) * 1000:8.1f} ms',
+            f'  first paint         {(self.first_paint - startup_started) * 1000:8.1f} ms',
+            f'  ready               {(ready - startup_started) * 1000:8.1f} ms',
+            f'  deferred startup    {(ready - self.first_paint) * 1000:8.1f} ms',
+            f'  heavy modules loaded before first paint: {", ".join(self.heavy_modules_at_paint) or "none"}',
+        ]
+        print('\n'.join(lines), file=sys.stderr)
+
     def apply_config(self):
         self.username.setText(self.config.get('username', ''))
         self.minecraft_folder.setText(self.config.get('minecraft_folder', minecraft_directory))
+        if self.config.get('version_filter') in VERSION_FILTERS:
+            self.version_filter.setCurrentText(self.config['version_filter'])
         if self.config.get('style') == 'white':
             self.white_style_button.setChecked(True)
         else:
             self.black_style_button.setChecked(True)
 
+    def save_jvm_profile(self, minecraft_folder, profile):
+        from jvm_profile import save_profile
+        save_profile(self.config, minecraft_folder, profile)
+        save_config(self.config)
+
     def save_config(self):
         self.config['username'] = self.username.text()
         self.config['minecraft_folder'] = self.minecraft_folder.text()
         self.config['style'] = 'white' if self.white_style_button.isChecked() else 'black'
+        self.config['version_filter'] = self.version_filter.currentText()
         save_config(self.config)
 
     def set_logo_icon(self, path):
@@ -297,37 +603,76 @@ class MainWindow(QMainWindow):
             QMessageBox.warning(self, "Error", f"Logo file not found: {path}")
 
     def populate_version_list(self):
-        try:
-            versions = get_version_list()
-            filtered_versions = self.filter_versions(versions)
-            sorted_versions = sorted(filtered_versions, key=lambda v: list(map(int, re.findall(r'\d+', v))), reverse=True)
-            for version in sorted_versions:
-                self.version_list.addItem(version)
-        except Exception as e:
-            logging.error(f"Error fetching version list: {e}")
-            QMessageBox.warning(self, "Error", "Failed to fetch version list")
-
-    def filter_versions(self, versions):
-        filtered = set()
-        pattern = re.compile(r'^\d+\.\d+\.\d+$')
-        forge_pattern = re.compile(r'^\d+\.\d+\.\d+-forge$')
-        for version in versions:
-            if pattern.match(version['id']):
-                filtered.add(version['id'])
-            if forge_pattern.match(version['id']):
-                base_version = version['id'].split('-')[0]
-                forge_version = f"{base_version} Forge"
-                if self.check_forge_exists(base_version):
-                    filtered.add(forge_version)
-        return filtered
+        # Show the last known list right away, then revalidate the manifest in the background
+        from manifest_cache import get_manifest_cache
+        self.manifest_cache = get_manifest_cache(minecraft_directory)
+        self.request_version_index(revalidate=False)
+        self.request_version_index(revalidate=True)
+
+    def request_version_index(self, revalidate=False):
+        # Index builds read the manifest and every custom version JSON, so they never run on the GUI thread
+        self.version_generation += 1
+        thread = ManifestThread(self.manifest_cache, self.prepare_versions, self.minecraft_folder.text(), self.version_generation, revalidate)
+        thread.versions_ready_signal.connect(self.version_index_ready)
+        if revalidate:
+            thread.manifest_error_signal.connect(self.show_manifest_error)
+        thread.finished.connect(self.manifest_thread_finished)
+        self.manifest_threads.append(thread)
+        thread.start()
+
+    def manifest_thread_finished(self):
+        self.manifest_threads = [thread for thread in self.manifest_threads if not thread.isFinished()]
+
+    def version_index_ready(self, generation, minecraft_folder, revalidated, version_index):
+        # Results for another folder, or older than the index on screen, are outdated
+        if minecraft_folder != self.minecraft_folder.text() or generation < self.applied_generation:
+            if revalidated:
+                # The manifest it fetched is in the cache now, rebuild from it for the current folder
+                self.request_version_index(revalidate=False)
+            return
+        self.applied_generation = generation
+        self.apply_version_list(version_index)
+
+    def prepare_versions(self, versions, minecraft_folder, probe=True):
+        # Parsing, sorting and Forge lookups happen here once, not on every keystroke
+        from version_index import build_version_index, forge_candidates
+        forge_available = self.forge_resolver.resolve(forge_candidates(versions), probe=probe)
+        return build_version_index(versions, forge_available, minecraft_folder)
+
+    def refresh_installed_versions(self):
+        # Picks up versions installed since the list was built, e.g. a new Forge profile
+        if self.manifest_cache is not None:
+            self.request_version_index(revalidate=False)
+
+    def apply_version_list(self, version_index):
+        self.version_index = version_index
+        self.filter_version_list()
+
+    def filter_version_list(self):
+        if self.version_index is None:
+            return
+        # Keep the selection when it still matches
+        selected = self.selected_version()
+        rows = self.version_index.filter(self.version_search.text(), self.version_filter.currentText())
+        self.version_model.set_rows(self.version_index, rows)
+        if selected is not None:
+            position = self.version_model.position_of(*selected)
+            if position is not None:
+                self.version_list.setCurrentIndex(self.version_model.index(position))
+                self.version_list.scrollTo(self.version_model.index(position))
+
+    def selected_version(self):
+        index = self.version_list.currentIndex()
+        if not index.isValid() or self.version_model.versions is None:
+            return None
+        return self.version_model.version_at(index.row())
+
+    def show_manifest_error(self, message):
+        logging.error(f"Error fetching version list: {message}")
+        QMessageBox.warning(self, "Error", "Failed to fetch version list")
 
     def check_forge_exists(self, base_version):
-        forge_installer_url = f'https://files.minecraftforge.net/maven/net/minecraftforge/forge/{base_version}-recommended/forge-{base_version}-recommended-installer.jar'
-        try:
-            response = requests.head(forge_installer_url)
-            return response.status_code == 200
-        except requests.RequestException:
-            return False
+        return self.forge_resolver.exists(base_version)
 
     def show_forge_error(self, message):
         QMessageBox.warning(self, "Forge Installation Error", message)
@@ -344,6 +689,8 @@ class MainWindow(QMainWindow):
     def state_update(self, value):
         self.start_button.setDisabled(value)
         self.start_progress.setVisible(value)
+        if not value:
+            self.refresh_installed_versions()
 
     def update_progress(self, progress, max_progress, label):
         self.start_progress.setValue(progress)
@@ -353,12 +700,18 @@ class MainWindow(QMainWindow):
     def launch_game(self):
         if not self.validate_input():
             return
-        selected_version = self.version_list.currentItem().text()
-        install_forge = self.install_forge_checkbox.isChecked()
-        if 'Forge' in selected_version:
-            selected_version = selected_version.replace(' Forge', '')
-            install_forge = True
+        selected = self.selected_version()
+        if selected is None:
+            QMessageBox.warning(self, "Input Error", "Choose a Minecraft version")
+            return
+        selected_version, forge = selected
+        install_forge = self.install_forge_checkbox.isChecked() or forge
         self.launch_thread.launch_setup_signal.emit(selected_version, self.username.text(), self.minecraft_folder.text(), install_forge)
+        self.launch_thread.install_engine = self.config.get('install_engine', 'parallel')
+        self.launch_thread.shared_store = self.config.get('shared_store', True)
+        self.launch_thread.progress_rate = self.config.get('progress_rate', 10)
+        # The thread sizes the JVM profile on its own copy and sends the result back
+        self.launch_thread.config = copy.deepcopy(self.config)
         self.launch_thread.start()
         self.save_config()
 
@@ -374,6 +727,32 @@ class MainWindow(QMainWindow):
         elif theme == "Light":
             self.set_style("white")
 
+    def refresh_instances(self):
+        records = self.supervisor.snapshot()
+        self.instances_list.setVisible(bool(records))
+        self.instances_list.clear()
+        for record in reversed(records):
+            if record['returncode'] is None:
+                cpu = f"{record['cpu_percent']:.0f}%" if record['cpu_percent'] is not None else '-'
+                rss = f"{record['rss'] / 1024 / 1024:.0f} MB" if record['rss'] else '-'
+                text = f"{record['version']}  pid {record['pid']}  running  CPU {cpu}  RAM {rss}"
+            else:
+                text = f"{record['version']}  pid {record['pid']}  exited with code {record['returncode']}"
+            self.instances_list.addItem(text)
+            self.instances_list.item(self.instances_list.count() - 1).setData(Qt.UserRole, record['pid'])
+
+    def show_instance_output(self, item):
+        pid = item.data(Qt.UserRole)
+        game = next((game for game in self.supervisor.snapshot_processes() if game.pid == pid), None)
+        if game is None:
+            return
+        message = QMessageBox(self)
+        message.setWindowTitle(f"{game.version_id} (pid {pid})")
+        message.setText(f"Log: {game.log_path}")
+        # Only the last lines, the full output is in the log file
+        message.setDetailedText('\n'.join(game.tail(200)))
+        message.exec_()
+
     def show_error_message(self, title, message):
         QMessageBox.critical(self, title, message)
 
@@ -381,6 +760,7 @@ class MainWindow(QMainWindow):
         current_version = "1.0.0"
         update_url = "https://example.com/launcher/update"
         try:
+            import requests
             response = requests.get(update_url)
             latest_version = response.json().get('version')
             if latest_version > current_version:
@@ -392,21 +772,51 @@ class MainWindow(QMainWindow):
         # Download and install update logic
         pass
 
+    # Backups are incremental snapshots in the launcher directory, shared by all instances
     def backup_data(self):
-        backup_folder = os.path.join(self.minecraft_folder, "backup")
-        if not os.path.exists(backup_folder):
-            os.makedirs(backup_folder)
-        # Copy necessary files to backup folder
-        shutil.copytree(self.minecraft_folder, backup_folder)
+        self.start_snapshot_thread(backup_instance, self.minecraft_folder.text())
 
     def restore_data(self):
-        backup_folder = os.path.join(self.minecraft_folder, "backup")
-        if os.path.exists(backup_folder):
-            # Restore files from backup folder
-            shutil.copytree(backup_folder, self.minecraft_folder)
+        from snapshot import snapshot_scopes, SnapshotStore
+        snapshots = list(reversed(SnapshotStore(snapshots_directory, launcher_directory=minecraft_directory).list_snapshots(self.minecraft_folder.text())))
+        if not snapshots:
+            QMessageBox.information(self, "Restore", "There are no backups of this folder yet")
+            return
+        labels = [f"{snapshot['id']} ({snapshot['size'] / 1024 / 1024:.1f} MB)" for snapshot in snapshots]
+        label, ok = QInputDialog.getItem(self, "Restore", "Backup:", labels, 0, False)
+        if not ok:
+            return
+        snapshot = snapshots[labels.index(label)]
+        # A single world or config folder can be restored without touching the rest
+        scope, ok = QInputDialog.getItem(self, "Restore", "What to restore:", ['Everything'] + snapshot_scopes(snapshot), 0, False)
+        if not ok:
+            return
+        paths = None if scope == 'Everything' else [scope]
+        self.start_snapshot_thread(restore_instance, snapshot['id'], self.minecraft_folder.text(), paths)
+
+    def start_snapshot_thread(self, action, *args):
+        if self.snapshot_thread is not None and self.snapshot_thread.isRunning():
+            return
+        self.backup_button.setDisabled(True)
+        self.restore_button.setDisabled(True)
+        self.snapshot_thread = SnapshotThread(action, *args)
+        self.snapshot_thread.snapshot_done_signal.connect(self.snapshot_done)
+        self.snapshot_thread.snapshot_error_signal.connect(lambda message: self.show_error_message("Backup Error", message))
+        self.snapshot_thread.finished.connect(self.snapshot_finished)
+        self.snapshot_thread.start()
+
+    def snapshot_done(self, message):
+        QMessageBox.information(self, "Backup", message)
+
+    def snapshot_finished(self):
+        self.backup_button.setDisabled(False)
+        self.restore_button.setDisabled(False)
 
 if __name__ == '__main__':
-    app = QApplication([])
-    window = MainWindow()
+    parser = argparse.ArgumentParser(description='HexoLauncher')
+    parser.add_argument('--profile-startup', action='store_true', help='Print import time and time to first paint')
+    args, qt_args = parser.parse_known_args()
+    app = QApplication(sys.argv[:1] + qt_args)
+    window = MainWindow(profile_startup=args.profile_startup)
     window.show()
     app.exec_()
@@ -0,0 +1,349 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+# Content-defined chunking: a cut is made where the 32-bit rolling gear hash has its top 16 bits
+# clear (about every 64 KiB), so an insert only changes the chunks around it instead of shifting
+# every chunk after it
+MIN_CHUNK_SIZE = 16 * 1024
+MAX_CHUNK_SIZE = 256 * 1024
+CUT_THRESHOLD = 0x10000
+READ_SIZE = 4 * 1024 * 1024
+
+# Derived from SHA1 instead of random so chunk boundaries never change between versions
+GEAR = [int.from_bytes(hashlib.sha1(bytes([i])).digest()[:4], 'little') for i in range(256)]
+
+# Stored chunks start with a marker byte; chunks that don't shrink (region files, jars) stay raw
+COMPRESSED = b'z'
+RAW = b'r'
+
+# Everything in here is downloaded again by the installer, so it is not worth backing up
+EXCLUDED = ('assets', 'libraries', 'versions', 'runtime', 'launch_plans', 'backup', 'install_index.json')
+
+# The launcher's own data, relative to the launcher directory. The default instance is the launcher
+# directory itself, so without this a backup would contain the snapshot store and the object store.
+LAUNCHER_PATHS = ('snapshots', 'store', 'forge_installers', 'mirror', 'supervisor', 'traces.jsonl', 'traces.jsonl.1',
+                  'metrics.prom', 'metrics.prom.tmp', 'launcher_config.json', 'forge_cache.json', 'version_manifest_cache.json')
+
+# Unreferenced chunks younger than this are kept by collect_garbage(), a running backup may still need them
+GC_GRACE_PERIOD = 3600
+
+
+class SnapshotError(Exception):
+    pass
+
+
+def find_cut(data, start, end, gear=GEAR):
+    # The hottest loop of a backup, hence the local gear table and h + h instead of a shift
+    position = start + MIN_CHUNK_SIZE
+    if position >= end:
+        return end
+    h = 0
+    for offset, byte in enumerate(data[position:end]):
+        h = (h + h + gear[byte]) & 0xFFFFFFFF
+        if h < CUT_THRESHOLD:
+            return position + offset + 1
+    return end
+
+
+def iter_chunks(file):
+    buffer = b''
+    eof = False
+    while not eof:
+        data = file.read(READ_SIZE)
+        eof = not data
+        buffer += data
+        view = memoryview(buffer)
+        start = 0
+        while start < len(buffer):
+            # The cut only depends on bytes after start, so waiting for more data gives the same chunks
+            if not eof and len(buffer) - start < MAX_CHUNK_SIZE:
+                break
+            cut = find_cut(view, start, min(start + MAX_CHUNK_SIZE, len(buffer)))
+            yield buffer[start:cut]
+            start = cut
+        view.release()
+        buffer = buffer[start:]
+
+
+def chunk_path(chunks_directory, sha1):
+    return os.path.join(chunks_directory, sha1[:2], sha1)
+
+
+def store_file(chunks_directory, path):
+    # Runs in worker processes: splits one file, stores its new chunks and returns their hashes
+    chunks = []
+    stored = 0
+    with open(path, 'rb') as file:
+        for chunk in iter_chunks(file):
+            sha1 = hashlib.sha1(chunk).hexdigest()
+            chunks.append(sha1)
+            target = chunk_path(chunks_directory, sha1)
+            try:
+                # Touching the chunk keeps collect_garbage() away until the snapshot references it
+                os.utime(target)
+                continue
+            except OSError:
+                pass
+            compressed = zlib.compress(chunk, 6)
+            data = COMPRESSED + compressed if len(compressed) < len(chunk) * 0.95 else RAW + chunk
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            temp_path = f'{target}.{os.getpid()}.{threading.get_ident()}.part'
+            with open(temp_path, 'wb') as chunk_file:
+                chunk_file.write(data)
+            os.replace(temp_path, target)
+            stored += len(data)
+    return chunks, stored
+
+
+def store_file_task(task):
+    try:
+        return store_file(*task)
+    except OSError as e:
+        # Files can disappear or be locked while the game is running
+        logging.warning(f"Skipping {task[1]}: {e}")
+        return None
+
+
+def is_selected(relative_path, paths):
+    return paths is None or any(relative_path == path or relative_path.startswith(path + '/') for path in paths)
+
+
+def snapshot_scopes(snapshot):
+    # What can be restored on its own: each world, and every other top-level file or folder
+    scopes = set()
+    for relative_path in snapshot['files']:
+        parts = relative_path.split('/')
+        if parts[0] == 'saves' and len(parts) > 2:
+            scopes.add('/'.join(parts[:2]))
+        else:
+            scopes.add(parts[0])
+    return sorted(scopes)
+
+
+class SnapshotStore:
+    # Incremental backups of instance folders. Files are split into content-defined chunks and every
+    # distinct chunk is stored once, compressed, for all snapshots of all instances. A file whose size
+    # and mtime match the previous snapshot is not read again.
+    def __init__(self, root, workers=None, launcher_directory=None):
+        self.root = os.path.abspath(root)
+        self.chunks_directory = os.path.join(self.root, 'chunks')
+        self.snapshots_directory = os.path.join(self.root, 'snapshots')
+        self.workers = workers or os.cpu_count() or 1
+        # Compared by absolute path, so a world or mod folder that happens to be called "store" is kept
+        self.excluded = {os.path.normcase(self.root)}
+        if launcher_directory:
+            self.excluded.update(os.path.normcase(os.path.abspath(os.path.join(launcher_directory, name))) for name in LAUNCHER_PATHS)
+
+    def snapshot_file(self, snapshot_id):
+        return os.path.join(self.snapshots_directory, f'{snapshot_id}.json')
+
+    def load(self, snapshot_id):
+        try:
+            with open(self.snapshot_file(snapshot_id), 'r') as file:
+                return json.load(file)
+        except (OSError, ValueError) as e:
+            raise SnapshotError(f"Snapshot {snapshot_id} can't be loaded: {e}")
+
+    def list_snapshots(self, source_directory=None):
+        source_directory = os.path.abspath(source_directory) if source_directory else None
+        snapshots = []
+        if not os.path.isdir(self.snapshots_directory):
+            return snapshots
+        for name in sorted(os.listdir(self.snapshots_directory)):
+            if not name.endswith('.json'):
+                continue
+            try:
+                snapshot = self.load(name[:-len('.json')])
+            except SnapshotError as e:
+                logging.warning(str(e))
+                continue
+            if source_directory is None or snapshot['source'] == source_directory:
+                snapshots.append(snapshot)
+        # Oldest first; ids of older launcher versions don't sort by name within one second
+        snapshots.sort(key=lambda snapshot: (snapshot['created'], snapshot['id']))
+        return snapshots
+
+    def new_snapshot_id(self):
+        # The zero-padded suffix keeps ids of the same second in creation order
+        timestamp = time.strftime('%Y%m%d-%H%M%S')
+        suffix = 1
+        while os.path.exists(self.snapshot_file(f'{timestamp}-{suffix:03d}')):
+            suffix += 1
+        return f'{timestamp}-{suffix:03d}'
+
+    def is_excluded(self, path):
+        return os.path.normcase(path) in self.excluded
+
+    def scan(self, source_directory):
+        files = {}
+        for directory, directories, names in os.walk(source_directory):
+            relative_directory = os.path.relpath(directory, source_directory).replace(os.sep, '/')
+            if relative_directory == '.':
+                directories[:] = [name for name in directories if name not in EXCLUDED]
+                names = [name for name in names if name not in EXCLUDED]
+                relative_directory = ''
+            directories[:] = [name for name in directories if not self.is_excluded(os.path.join(directory, name))]
+            for name in names:
+                if name.endswith('.part'):
+                    continue
+                path = os.path.join(directory, name)
+                if self.is_excluded(path):
+                    continue
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                files[f'{relative_directory}/{name}'.lstrip('/')] = (path, stat)
+        return files
+
+    def create(self, source_directory):
+        source_directory = os.path.abspath(source_directory)
+        if os.path.normcase(os.path.join(source_directory, '')).startswith(os.path.normcase(os.path.join(self.root, ''))):
+            raise SnapshotError(f"{source_directory} is inside the backup store and can't be backed up")
+        previous = self.list_snapshots(source_directory)
+        previous_files = previous[-1]['files'] if previous else {}
+
+        entries = {}
+        changed = []
+        for relative_path, (path, stat) in self.scan(source_directory).items():
+            entry = previous_files.get(relative_path)
+            if entry is not None and entry[0] == stat.st_size and entry[1] == stat.st_mtime_ns:
+                entries[relative_path] = entry
+            else:
+                entries[relative_path] = [stat.st_size, stat.st_mtime_ns, stat.st_mode & 0o777, None]
+                changed.append(relative_path)
+
+        start = time.perf_counter()
+        stored = 0
+        changed_bytes = sum(entries[relative_path][0] for relative_path in changed)
+        tasks = [(self.chunks_directory, os.path.join(source_directory, *relative_path.split('/'))) for relative_path in changed]
+        if self.workers > 1 and len(tasks) > 1:
+            # Chunking is pure Python, so it is spread over processes rather than threads
+            with ProcessPoolExecutor(max_workers=self.workers) as pool:
+                results = list(pool.map(store_file_task, tasks, chunksize=8))
+        else:
+            results = [store_file_task(task) for task in tasks]
+        for relative_path, result in zip(changed, results):
+            if result is None:
+                del entries[relative_path]
+                continue
+            entries[relative_path][3], stored_bytes = result
+            stored += stored_bytes
+
+        snapshot = {
+            'id': self.new_snapshot_id(),
+            'source': source_directory,
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'size': sum(entry[0] for entry in entries.values()),
+            'changed': changed_bytes,
+            'stored': stored,
+            'files': entries,
+        }
+        os.makedirs(self.snapshots_directory, exist_ok=True)
+        tmp_file = self.snapshot_file(snapshot['id']) + '.tmp'
+        with open(tmp_file, 'w') as file:
+            json.dump(snapshot, file)
+        os.replace(tmp_file, self.snapshot_file(snapshot['id']))
+        logging.info(f"Snapshot {snapshot['id']}: {len(entries)} files, {len(changed)} changed ({changed_bytes} bytes), "
+                     f"{stored} bytes stored in {time.perf_counter() - start:.1f}s")
+        return snapshot
+
+    def read_chunk(self, sha1):
+        try:
+            with open(chunk_path(self.chunks_directory, sha1), 'rb') as file:
+                data = file.read()
+        except OSError as e:
+            raise SnapshotError(f"Chunk {sha1} is missing: {e}")
+        chunk = zlib.decompress(data[1:]) if data[:1] == COMPRESSED else data[1:]
+        if hashlib.sha1(chunk).hexdigest() != sha1:
+            raise SnapshotError(f"Chunk {sha1} is corrupted")
+        return chunk
+
+    def restore_file(self, entry, target):
+        size, mtime, mode, chunks = entry
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        temp_path = f'{target}.{threading.get_ident()}.part'
+        with open(temp_path, 'wb') as file:
+            for sha1 in chunks:
+                file.write(self.read_chunk(sha1))
+        os.chmod(temp_path, mode)
+        os.utime(temp_path, ns=(mtime, mtime))
+        os.replace(temp_path, target)
+
+    def restore(self, snapshot_id, target_directory=None, paths=None):
+        # paths limits the restore to some files or folders, e.g. ['saves/New World', 'options.txt'].
+        # Inside the restored paths, files that an earlier backup of this folder recorded but this
+        # snapshot doesn't have are removed; files no backup has ever seen are left alone.
+        snapshot = self.load(snapshot_id)
+        target_directory = os.path.abspath(target_directory or snapshot['source'])
+        paths = [path.strip('/') for path in paths] if paths else None
+        selected = {relative_path: entry for relative_path, entry in snapshot['files'].items() if is_selected(relative_path, paths)}
+        if paths and not selected:
+            raise SnapshotError(f"Snapshot {snapshot_id} has nothing under {', '.join(paths)}")
+
+        pending = []
+        for relative_path, entry in selected.items():
+            target = os.path.join(target_directory, *relative_path.split('/'))
+            try:
+                stat = os.stat(target)
+                if stat.st_size == entry[0] and stat.st_mtime_ns == entry[1]:
+                    continue
+            except OSError:
+                pass
+            pending.append((entry, target))
+        # zlib and file I/O release the GIL, so threads are enough here
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            list(pool.map(lambda task: self.restore_file(*task), pending))
+
+        known = set()
+        for other in self.list_snapshots(snapshot['source']):
+            known.update(other['files'])
+        removed = 0
+        for relative_path in self.scan(target_directory):
+            if relative_path in known and relative_path not in selected and is_selected(relative_path, paths):
+                os.remove(os.path.join(target_directory, *relative_path.split('/')))
+                removed += 1
+        logging.info(f"Restored {len(pending)} of {len(selected)} files from snapshot {snapshot_id}, removed {removed}")
+        return len(pending), len(selected) - len(pending), removed
+
+    def delete(self, snapshot_id):
+        try:
+            os.remove(self.snapshot_file(snapshot_id))
+        except OSError as e:
+            raise SnapshotError(f"Snapshot {snapshot_id} can't be deleted: {e}")
+
+    def collect_garbage(self, grace_period=GC_GRACE_PERIOD):
+        references = set()
+        for snapshot in self.list_snapshots():
+            for entry in snapshot['files'].values():
+                references.update(entry[3])
+
+        removed = 0
+        freed = 0
+        cutoff = time.time() - grace_period
+        if not os.path.isdir(self.chunks_directory):
+            return removed, freed
+        for prefix in os.listdir(self.chunks_directory):
+            prefix_directory = os.path.join(self.chunks_directory, prefix)
+            for name in os.listdir(prefix_directory):
+                # Skip referenced chunks and chunks that are still being written
+                if name in references or '.' in name:
+                    continue
+                path = os.path.join(prefix_directory, name)
+                try:
+                    stat = os.stat(path)
+                    if stat.st_mtime > cutoff:
+                        continue
+                    os.remove(path)
+                except OSError:
+                    continue
+                freed += stat.st_size
+                removed += 1
+        logging.info(f"Snapshot GC removed {removed} chunks, freed {freed} bytes")
+        return removed, freed
@@ -0,0 +1,429 @@
+import json
+import logging
+import os
+import re
+import subprocess
+import sys
+import threading
+import time
+from collections import deque
+
+from launch_plan import spawn
+
+RING_BUFFER_LINES = 2000
+MAX_LOG_SIZE = 5 * 1024 * 1024
+LOG_BACKUPS = 3
+# Every launch gets its own log; only the newest ones of each version are kept
+KEPT_LAUNCH_LOGS = 10
+SAMPLE_INTERVAL = 5
+
+# Exited instances stay in the state file this long, so crash loops show up in `status`
+HISTORY_SECONDS = 24 * 60 * 60
+CRASH_LOOP_EXITS = 3
+CRASH_LOOP_WINDOW = 10 * 60
+
+# How much of a log file tail() reads from the end
+TAIL_BYTES = 256 * 1024
+
+PROCESS_QUERY_LIMITED_INFORMATION = 0x1000
+STILL_ACTIVE = 259
+
+
+def clock_ticks():
+    try:
+        return os.sysconf('SC_CLK_TCK')
+    except (AttributeError, ValueError, OSError):
+        return 100
+
+
+def read_proc_stat(pid):
+    # Returns (CPU seconds used, start time in clock ticks), or None without /proc or once the process is gone
+    try:
+        with open(f'/proc/{pid}/stat', 'r') as file:
+            data = file.read()
+    except OSError:
+        return None
+    # The command name is in parentheses and may contain spaces, the numeric fields follow it
+    fields = data[data.rindex(')') + 2:].split()
+    return (int(fields[11]) + int(fields[12])) / clock_ticks(), int(fields[19])
+
+
+def read_rss(pid):
+    try:
+        with open(f'/proc/{pid}/statm', 'r') as file:
+            return int(file.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def is_alive_windows(pid):
+    # os.kill(pid, 0) would send CTRL_C_EVENT on Windows, so ask for the exit code instead
+    import ctypes
+    kernel32 = ctypes.windll.kernel32
+    handle = kernel32.OpenProcess(PROCESS_QUERY_LIMITED_INFORMATION, False, pid)
+    if not handle:
+        return False
+    try:
+        exit_code = ctypes.c_ulong()
+        if not kernel32.GetExitCodeProcess(handle, ctypes.byref(exit_code)):
+            return False
+        return exit_code.value == STILL_ACTIVE
+    finally:
+        kernel32.CloseHandle(handle)
+
+
+def is_alive(pid, start_ticks):
+    stat = read_proc_stat(pid)
+    if stat is not None:
+        # A recycled pid has a different start time
+        return start_ticks is None or stat[1] == start_ticks
+    if os.path.isdir('/proc'):
+        return False
+    if os.name == 'nt':
+        return is_alive_windows(pid)
+    try:
+        os.kill(pid, 0)
+        return True
+    except OSError:
+        return False
+
+
+def session_args():
+    # Popen arguments that keep the game running, and out of reach of Ctrl-C, after the launcher exits
+    if os.name == 'nt':
+        return {'creationflags': subprocess.CREATE_NEW_PROCESS_GROUP}
+    return {'start_new_session': True}
+
+
+def prune_launch_logs(log_directory, version_id, keep=KEPT_LAUNCH_LOGS, in_use=()):
+    # Launch logs with their rotated parts (.log.1 ...), grouped by launch
+    pattern = re.compile(re.escape(version_id) + r'-\d{8}-\d{6}(-\d+)?\.log')
+    launches = {}
+    try:
+        names = os.listdir(log_directory)
+    except OSError:
+        return
+    for name in names:
+        match = pattern.match(name)
+        if match and (name == match.group(0) or name[match.end():].lstrip('.').isdigit()):
+            launches.setdefault(os.path.join(log_directory, match.group(0)), []).append(os.path.join(log_directory, name))
+
+    def modified(path):
+        try:
+            return os.path.getmtime(path)
+        except OSError:
+            return 0
+
+    for log_path in sorted(launches, key=modified, reverse=True)[keep:]:
+        if log_path in in_use:
+            continue
+        for path in launches[log_path]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+def read_tail(path, count):
+    try:
+        with open(path, 'rb') as file:
+            file.seek(max(0, os.path.getsize(path) - TAIL_BYTES))
+            lines = file.read().decode('utf-8', errors='replace').splitlines()
+    except OSError:
+        return []
+    return lines[-count:]
+
+
+class RotatingLog:
+    def __init__(self, path, max_size=MAX_LOG_SIZE, backups=LOG_BACKUPS):
+        self.path = path
+        self.max_size = max_size
+        self.backups = backups
+        self.lock = threading.Lock()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.file = open(path, 'a', encoding='utf-8')
+
+    def rotate(self):
+        self.file.close()
+        for number in range(self.backups - 1, 0, -1):
+            if os.path.exists(f'{self.path}.{number}'):
+                os.replace(f'{self.path}.{number}', f'{self.path}.{number + 1}')
+        os.replace(self.path, f'{self.path}.1')
+        self.file = open(self.path, 'a', encoding='utf-8')
+
+    def write(self, line):
+        with self.lock:
+            self.file.write(line + '\n')
+            if self.file.tell() > self.max_size:
+                self.rotate()
+
+    def close(self):
+        with self.lock:
+            self.file.close()
+
+
+class GameProcess:
+    def __init__(self, process, version_id, instance_directory, log_path):
+        self.process = process
+        self.pid = process.pid
+        self.version_id = version_id
+        self.instance_directory = instance_directory
+        self.log_path = log_path
+        self.started = time.time()
+        self.ended = None
+        self.returncode = None
+        self.output = deque(maxlen=RING_BUFFER_LINES)
+        stat = read_proc_stat(self.pid)
+        self.start_ticks = stat[1] if stat else None
+        self.cpu_seconds = stat[0] if stat else None
+        self.sampled = time.monotonic()
+        self.cpu_percent = None
+        self.rss = None
+
+    @property
+    def running(self):
+        return self.returncode is None
+
+    def tail(self, count):
+        # Games that write straight into their log file have an empty ring buffer
+        if self.output:
+            return list(self.output)[-count:]
+        return read_tail(self.log_path, count)
+
+    def record(self):
+        return {
+            'pid': self.pid,
+            'start_ticks': self.start_ticks,
+            'version': self.version_id,
+            'instance': self.instance_directory,
+            'log': self.log_path,
+            'started': self.started,
+            'ended': self.ended,
+            'returncode': self.returncode,
+            'cpu_percent': self.cpu_percent,
+            'rss': self.rss,
+        }
+
+
+class Supervisor:
+    # Keeps track of every game started by this launcher process. Output is read by one thread per
+    # stream into a ring buffer and a rotated log file; CPU and RSS are sampled from /proc. The state
+    # is written to supervisor/<launcher pid>.json, which `status` reads from any other process.
+    def __init__(self, launcher_directory, sample_interval=SAMPLE_INTERVAL, echo=False):
+        self.state_directory = os.path.join(launcher_directory, 'supervisor')
+        self.state_file = os.path.join(self.state_directory, f'{os.getpid()}.json')
+        self.sample_interval = sample_interval
+        self.echo = echo
+        self.processes = []
+        self.lock = threading.Lock()
+        self.sampler = None
+        self.stopped = threading.Event()
+
+    def launch(self, plan, username, uuid, token, cwd, version_id, detach=False, new_session=False):
+        # detach: the game gets its own session and writes straight into its log file, so the whole output
+        # is kept after the launcher exits, but there is no ring buffer and the file is not rotated (--detach).
+        # new_session: the output is still piped through the launcher, but the game gets its own session
+        # and outlives the launcher (GUI); after the launcher exits only the game's own logs/latest.log is written
+        log_directory = os.path.join(cwd, 'logs', 'launcher')
+        os.makedirs(log_directory, exist_ok=True)
+        prune_launch_logs(log_directory, version_id, KEPT_LAUNCH_LOGS - 1, {game.log_path for game in self.running()})
+        log_path = os.path.join(log_directory, f"{version_id}-{time.strftime('%Y%m%d-%H%M%S')}.log")
+        suffix = 1
+        while os.path.exists(log_path):
+            suffix += 1
+            log_path = os.path.join(log_directory, f"{version_id}-{time.strftime('%Y%m%d-%H%M%S')}-{suffix}.log")
+        if detach:
+            with open(log_path, 'ab') as log_file:
+                process = spawn(plan, username, uuid, token, cwd=cwd, stdout=log_file, stderr=subprocess.STDOUT,
+                                stdin=subprocess.DEVNULL, **session_args())
+            game = GameProcess(process, version_id, os.path.abspath(cwd), log_path)
+        else:
+            process = spawn(plan, username, uuid, token, cwd=cwd, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                            stdin=subprocess.DEVNULL, **(session_args() if new_session else {}))
+            game = GameProcess(process, version_id, os.path.abspath(cwd), log_path)
+            log = RotatingLog(log_path)
+            readers = [threading.Thread(target=self.pump, args=(game, stream, log, prefix), name=f'game-{game.pid}-{name}', daemon=True)
+                       for stream, name, prefix in ((process.stdout, 'stdout', ''), (process.stderr, 'stderr', '[stderr] '))]
+            for reader in readers:
+                reader.start()
+            threading.Thread(target=self.watch, args=(game, readers, log), name=f'game-{game.pid}-watch', daemon=True).start()
+
+        with self.lock:
+            self.processes.append(game)
+            if self.sampler is None:
+                self.sampler = threading.Thread(target=self.sample_loop, name='supervisor-sampler', daemon=True)
+                self.sampler.start()
+        logging.info(f"Started {version_id} as pid {game.pid}, log: {log_path}")
+        self.save_state()
+        return game
+
+    def pump(self, game, stream, log, prefix):
+        # readline() blocks only this thread; the deque drops the oldest lines once it is full
+        for raw_line in iter(stream.readline, b''):
+            line = prefix + raw_line.decode('utf-8', errors='replace').rstrip('\r\n')
+            game.output.append(line)
+            log.write(line)
+            if self.echo:
+                print(line, file=sys.stderr if prefix else sys.stdout, flush=True)
+        stream.close()
+
+    def watch(self, game, readers, log):
+        for reader in readers:
+            reader.join()
+        self.finish(game, game.process.wait())
+        log.close()
+
+    def finish(self, game, returncode):
+        with self.lock:
+            if not game.running:
+                return
+            game.returncode = returncode
+            game.ended = time.time()
+        level = logging.INFO if returncode == 0 else logging.WARNING
+        logging.log(level, f"{game.version_id} (pid {game.pid}) exited with code {returncode} after {game.ended - game.started:.0f}s")
+        self.save_state()
+
+    def sample(self, game):
+        stat = read_proc_stat(game.pid)
+        now = time.monotonic()
+        if stat is None:
+            return
+        if game.cpu_seconds is not None and now > game.sampled:
+            game.cpu_percent = round((stat[0] - game.cpu_seconds) / (now - game.sampled) * 100, 1)
+        game.cpu_seconds = stat[0]
+        game.sampled = now
+        game.rss = read_rss(game.pid)
+
+    def sample_loop(self):
+        while not self.stopped.wait(self.sample_interval):
+            for game in self.snapshot_processes():
+                if not game.running:
+                    continue
+                # Detached games have no watcher thread, poll() is what notices their exit
+                if game.process.stdout is None and game.process.poll() is not None:
+                    self.finish(game, game.process.returncode)
+                    continue
+                self.sample(game)
+            self.save_state()
+
+    def snapshot_processes(self):
+        with self.lock:
+            return list(self.processes)
+
+    def snapshot(self):
+        return [game.record() for game in self.snapshot_processes()]
+
+    def running(self):
+        return [game for game in self.snapshot_processes() if game.running]
+
+    def save_state(self):
+        cutoff = time.time() - HISTORY_SECONDS
+        with self.lock:
+            self.processes = [game for game in self.processes if game.running or game.ended > cutoff]
+            records = [game.record() for game in self.processes]
+        try:
+            os.makedirs(self.state_directory, exist_ok=True)
+            tmp_file = f'{self.state_file}.{threading.get_ident()}.tmp'
+            with open(tmp_file, 'w') as file:
+                json.dump({'launcher_pid': os.getpid(), 'processes': records}, file)
+            os.replace(tmp_file, self.state_file)
+        except OSError as e:
+            logging.debug("Could not save supervisor state: %s", e)
+
+    def wait(self):
+        # Console launches stay in the foreground until every game has exited
+        returncode = 0
+        for game in self.snapshot_processes():
+            code = game.process.wait()
+            if game.process.stdout is None:
+                self.finish(game, code)
+            # The watcher thread records the exit once the output is drained
+            while game.running:
+                time.sleep(0.1)
+            returncode = returncode or code
+        return returncode
+
+    def stop(self):
+        self.stopped.set()
+
+
+def collect_status(launcher_directory, sample_time=0.5):
+    # Reads the state of all launcher processes and samples running games live, so it also works
+    # for detached games whose launcher has already exited
+    state_directory = os.path.join(launcher_directory, 'supervisor')
+    records = []
+    try:
+        names = os.listdir(state_directory)
+    except OSError:
+        return records
+    cutoff = time.time() - HISTORY_SECONDS
+    for name in names:
+        if not name.endswith('.json'):
+            continue
+        try:
+            with open(os.path.join(state_directory, name), 'r') as file:
+                state = json.load(file)
+        except (OSError, ValueError):
+            continue
+        launcher_alive = is_alive(state.get('launcher_pid', 0), None)
+        for record in state.get('processes', []):
+            # A game that exited while nobody was watching stays without exit code
+            record['running'] = record['returncode'] is None and is_alive(record['pid'], record['start_ticks'])
+            if record['running'] or (record['ended'] or record['started']) > cutoff:
+                records.append(record)
+        if not launcher_alive and not any(record in records for record in state.get('processes', [])):
+            try:
+                os.remove(os.path.join(state_directory, name))
+            except OSError:
+                # Another launcher or `status` removed it first
+                pass
+
+    running = [record for record in records if record['running']]
+    before = {record['pid']: read_proc_stat(record['pid']) for record in running}
+    if running:
+        time.sleep(sample_time)
+    for record in running:
+        after = read_proc_stat(record['pid'])
+        if before[record['pid']] and after:
+            record['cpu_percent'] = round((after[0] - before[record['pid']][0]) / sample_time * 100, 1)
+        record['rss'] = read_rss(record['pid'])
+    return sorted(records, key=lambda record: record['started'])
+
+
+def crash_loops(records):
+    # Instances whose game failed CRASH_LOOP_EXITS times within CRASH_LOOP_WINDOW
+    failures = {}
+    for record in records:
+        if record['running'] or record['returncode'] in (None, 0):
+            continue
+        failures.setdefault((record['instance'], record['version']), []).append(record['ended'] or record['started'])
+    loops = []
+    for key, times in failures.items():
+        times.sort()
+        for position in range(len(times) - CRASH_LOOP_EXITS + 1):
+            if times[position + CRASH_LOOP_EXITS - 1] - times[position] <= CRASH_LOOP_WINDOW:
+                loops.append(key)
+                break
+    return loops
+
+
+def format_status(records):
+    lines = [f"{'PID':>7}  {'VERSION':<16} {'STATE':<10} {'CPU':>6}  {'RSS':>9}  {'UPTIME':>8}  INSTANCE"]
+    now = time.time()
+    for record in records:
+        if record['running']:
+            state = 'running'
+        elif record['returncode'] is None:
+            state = 'gone'
+        else:
+            state = f"exit {record['returncode']}"
+        cpu = f"{record['cpu_percent']:.0f}%" if record['running'] and record.get('cpu_percent') is not None else '-'
+        rss = f"{record['rss'] / 1024 / 1024:.0f} MB" if record['running'] and record.get('rss') else '-'
+        if record['running'] or record['ended']:
+            uptime = f"{((now if record['running'] else record['ended']) - record['started']) / 60:.0f}m"
+        else:
+            uptime = '-'
+        lines.append(f"{record['pid']:>7}  {record['version']:<16} {state:<10} {cpu:>6}  {rss:>9}  {uptime:>8}  {record['instance']}")
+    for instance, version_id in crash_loops(records):
+        lines.append(f"Crash loop: {version_id} in {instance} failed {CRASH_LOOP_EXITS}+ times within {CRASH_LOOP_WINDOW // 60} minutes")
+    return lines
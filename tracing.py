@@ -0,0 +1,179 @@
+import json
+import logging
+import os
+import threading
+import time
+
+DURATION_BUCKETS = (0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60, 300)
+
+# traces.jsonl is rotated once it grows past this size
+MAX_TRACE_FILE_SIZE = 10 * 1024 * 1024
+
+
+class NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def set(self, **attributes):
+        pass
+
+
+NULL_SPAN = NullSpan()
+
+
+class Span:
+    def __init__(self, tracer, name, kind, attributes):
+        self.tracer = tracer
+        self.name = name
+        self.kind = kind
+        self.attributes = attributes
+        self.span_id = None
+        self.parent_id = None
+        self.started = None
+        self.start = None
+        self.duration = None
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def __enter__(self):
+        self.span_id, self.parent_id = self.tracer.push()
+        self.started = time.time()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.duration = time.perf_counter() - self.start
+        if exc is not None:
+            self.attributes['error'] = repr(exc)
+        self.tracer.pop()
+        self.tracer.finish(self)
+        return False
+
+
+class Tracer:
+    # Spans for launch stages (kind='stage') and network requests (kind='http').
+    # Finished spans are buffered and exported by flush() as JSON lines and as a
+    # Prometheus textfile; while disabled, span() returns a shared no-op object.
+    def __init__(self):
+        self.enabled = False
+        self.jsonl_path = None
+        self.prometheus_path = None
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.next_id = 0
+        self.buffer = []
+        self.durations = {}
+        self.bytes = {}
+        self.cache = {}
+
+    def configure(self, jsonl_path=None, prometheus_path=None, enabled=True):
+        self.jsonl_path = jsonl_path
+        self.prometheus_path = prometheus_path
+        self.enabled = enabled
+
+    def span(self, name, kind='stage', **attributes):
+        if not self.enabled:
+            return NULL_SPAN
+        return Span(self, name, kind, attributes)
+
+    def push(self):
+        stack = getattr(self.local, 'stack', None)
+        if stack is None:
+            stack = self.local.stack = []
+        with self.lock:
+            self.next_id += 1
+            span_id = self.next_id
+        parent_id = stack[-1] if stack else None
+        stack.append(span_id)
+        return span_id, parent_id
+
+    def pop(self):
+        self.local.stack.pop()
+
+    def finish(self, span):
+        record = {
+            'id': span.span_id,
+            'parent': span.parent_id,
+            'kind': span.kind,
+            'name': span.name,
+            'start': round(span.started, 6),
+            'duration': round(span.duration, 6),
+        }
+        record.update(span.attributes)
+        key = (span.kind, span.name)
+        with self.lock:
+            self.buffer.append(record)
+            histogram = self.durations.setdefault(key, [0.0, 0] + [0] * len(DURATION_BUCKETS))
+            histogram[0] += span.duration
+            histogram[1] += 1
+            for position, bound in enumerate(DURATION_BUCKETS):
+                if span.duration <= bound:
+                    histogram[2 + position] += 1
+            if span.attributes.get('bytes'):
+                self.bytes[key] = self.bytes.get(key, 0) + span.attributes['bytes']
+            if 'cache' in span.attributes:
+                cache_key = key + (span.attributes['cache'],)
+                self.cache[cache_key] = self.cache.get(cache_key, 0) + 1
+
+    def flush(self):
+        if not self.enabled:
+            return
+        with self.lock:
+            records = self.buffer
+            self.buffer = []
+            durations = {key: list(value) for key, value in self.durations.items()}
+            byte_counts = dict(self.bytes)
+            cache_counts = dict(self.cache)
+        try:
+            if self.jsonl_path and records:
+                self.write_jsonl(records)
+            if self.prometheus_path:
+                self.write_prometheus(durations, byte_counts, cache_counts)
+        except OSError as e:
+            logging.warning(f"Could not export traces: {e}")
+
+    def write_jsonl(self, records):
+        os.makedirs(os.path.dirname(self.jsonl_path) or '.', exist_ok=True)
+        if os.path.isfile(self.jsonl_path) and os.path.getsize(self.jsonl_path) > MAX_TRACE_FILE_SIZE:
+            os.replace(self.jsonl_path, self.jsonl_path + '.1')
+        with open(self.jsonl_path, 'a') as file:
+            for record in records:
+                file.write(json.dumps(record) + '\n')
+
+    def write_prometheus(self, durations, byte_counts, cache_counts):
+        lines = [
+            '# HELP hexolauncher_span_duration_seconds Duration of launch stages and network requests.',
+            '# TYPE hexolauncher_span_duration_seconds histogram',
+        ]
+        for (kind, name), histogram in sorted(durations.items()):
+            labels = f'kind="{kind}",name="{name}"'
+            for position, bound in enumerate(DURATION_BUCKETS):
+                lines.append(f'hexolauncher_span_duration_seconds_bucket{{{labels},le="{bound}"}} {histogram[2 + position]}')
+            lines.append(f'hexolauncher_span_duration_seconds_bucket{{{labels},le="+Inf"}} {histogram[1]}')
+            lines.append(f'hexolauncher_span_duration_seconds_sum{{{labels}}} {histogram[0]:.6f}')
+            lines.append(f'hexolauncher_span_duration_seconds_count{{{labels}}} {histogram[1]}')
+        lines.append('# HELP hexolauncher_span_bytes_total Bytes transferred inside spans.')
+        lines.append('# TYPE hexolauncher_span_bytes_total counter')
+        for (kind, name), count in sorted(byte_counts.items()):
+            lines.append(f'hexolauncher_span_bytes_total{{kind="{kind}",name="{name}"}} {count}')
+        lines.append('# HELP hexolauncher_cache_lookups_total Cache hits and misses per span type.')
+        lines.append('# TYPE hexolauncher_cache_lookups_total counter')
+        for (kind, name, result), count in sorted(cache_counts.items()):
+            lines.append(f'hexolauncher_cache_lookups_total{{kind="{kind}",name="{name}",result="{result}"}} {count}')
+
+        # Textfile collectors read the file at any time, so replace it atomically
+        tmp_path = self.prometheus_path + '.tmp'
+        with open(tmp_path, 'w') as file:
+            file.write('\n'.join(lines) + '\n')
+        os.replace(tmp_path, self.prometheus_path)
+
+
+tracer = Tracer()
+
+
+def configure_tracing(directory, enabled=True):
+    tracer.configure(os.path.join(directory, 'traces.jsonl'), os.path.join(directory, 'metrics.prom'), enabled)
@@ -0,0 +1,137 @@
+import json
+import logging
+import os
+import re
+
+FORGE_CANDIDATE = re.compile(r'^(\d+\.\d+\.\d+)-forge$')
+
+# Choices of the type filter and the version types each one shows; None shows everything
+VERSION_FILTERS = ('Releases', 'All', 'Snapshots', 'Old', 'Installed')
+FILTER_TYPES = {
+    'Releases': ('release', 'forge', 'custom'),
+    'All': None,
+    'Snapshots': ('snapshot',),
+    'Old': ('old_beta', 'old_alpha'),
+    'Installed': None,
+}
+
+
+def forge_candidates(versions):
+    return [match.group(1) for match in (FORGE_CANDIDATE.match(version['id']) for version in versions) if match]
+
+
+def version_tuple(version_id):
+    return tuple(int(number) for number in re.findall(r'\d+', version_id))
+
+
+def installed_versions(minecraft_directory):
+    # Version folders of an instance: {version_id: path of its JSON}
+    versions_directory = os.path.join(minecraft_directory, 'versions')
+    try:
+        names = os.listdir(versions_directory)
+    except OSError:
+        return {}
+    installed = {}
+    for name in names:
+        path = os.path.join(versions_directory, name, f'{name}.json')
+        if os.path.isfile(path):
+            installed[name] = path
+    return installed
+
+
+def read_custom_version(path):
+    try:
+        with open(path, 'r') as file:
+            version = json.load(file)
+        return version.get('releaseTime', '')
+    except (OSError, ValueError) as e:
+        logging.warning(f"Skipping unreadable version {path}: {e}")
+        return None
+
+
+class VersionIndex:
+    # Every version of the manifest plus Forge builds and custom versions installed in the instance,
+    # sorted newest first into parallel lists once, off the GUI thread. filter() returns row numbers;
+    # when the query only grew since the last call it narrows the last result instead of rescanning.
+    def __init__(self, entries):
+        # entries: (version_id, type, release_time, installed)
+        entries = sorted(entries, key=lambda entry: (entry[2], version_tuple(entry[0]), entry[1] == 'forge'), reverse=True)
+        self.ids = [entry[0] for entry in entries]
+        self.types = [entry[1] for entry in entries]
+        self.release_times = [entry[2] for entry in entries]
+        self.installed = [entry[3] for entry in entries]
+        self.search_texts = [f'{self.display(row)} {self.types[row]}'.lower() for row in range(len(entries))]
+        self.type_rows = {}
+        self.last_filter = None
+        self.last_query = None
+        self.last_rows = None
+
+    def __len__(self):
+        return len(self.ids)
+
+    def display(self, row):
+        return f'{self.ids[row]} Forge' if self.types[row] == 'forge' else self.ids[row]
+
+    def is_forge(self, row):
+        return self.types[row] == 'forge'
+
+    def find(self, version_id, forge=False):
+        for row, (row_id, row_type) in enumerate(zip(self.ids, self.types)):
+            if row_id == version_id and (row_type == 'forge') == forge:
+                return row
+        return None
+
+    def rows_for_filter(self, version_filter):
+        if version_filter not in self.type_rows:
+            types = FILTER_TYPES.get(version_filter)
+            if version_filter == 'Installed':
+                rows = [row for row in range(len(self.ids)) if self.installed[row]]
+            elif types is None:
+                rows = list(range(len(self.ids)))
+            else:
+                rows = [row for row in range(len(self.ids)) if self.types[row] in types]
+            self.type_rows[version_filter] = rows
+        return self.type_rows[version_filter]
+
+    def filter(self, query='', version_filter='All'):
+        query = query.lower()
+        terms = query.split()
+        if version_filter == self.last_filter and self.last_query is not None and query.startswith(self.last_query):
+            # Every term of the longer query contains a term of the shorter one, so matches can only drop out
+            candidates = self.last_rows
+        else:
+            candidates = self.rows_for_filter(version_filter)
+        if terms:
+            search_texts = self.search_texts
+            rows = [row for row in candidates if all(term in search_texts[row] for term in terms)]
+        else:
+            rows = candidates
+        self.last_filter = version_filter
+        self.last_query = query
+        self.last_rows = rows
+        return rows
+
+
+def build_version_index(versions, forge_available=None, minecraft_directory=None):
+    # versions: manifest entries; forge_available: {base_version: bool} from ForgeResolver.resolve
+    installed = installed_versions(minecraft_directory) if minecraft_directory else {}
+    release_times = {}
+    entries = []
+    for version in versions:
+        release_times[version['id']] = version.get('releaseTime', '')
+        # The -forge entries only tell which versions to probe for Forge
+        if FORGE_CANDIDATE.match(version['id']):
+            continue
+        entries.append((version['id'], version.get('type', 'release'), release_times[version['id']], version['id'] in installed))
+    for base_version, exists in (forge_available or {}).items():
+        if exists:
+            release_time = release_times.get(base_version) or release_times.get(f'{base_version}-forge', '')
+            entries.append((base_version, 'forge', release_time, False))
+    # Forge profiles and other versions that only exist in the instance folder
+    for version_id, path in installed.items():
+        if version_id in release_times:
+            continue
+        release_time = read_custom_version(path)
+        if release_time is not None:
+            entries.append((version_id, 'custom', release_time, True))
+    return VersionIndex(entries)